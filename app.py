@@ -1,14 +1,17 @@
 from flask import Flask, jsonify, request, send_file
 import uuid
 import os
-from datetime import datetime
 import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
 import csv
 import logging
 
 from services.report_service import ReportService
 from services.data_service import DataService
-from models.db import init_db, StoreStatus, BusinessHours, StoreTimezone
+from models.db import init_db
 
 # Configure logging to file instead of console
 logging.basicConfig(
@@ -18,6 +21,8 @@ logging.basicConfig(
 )
 
 app = Flask(__name__)
+# Let a fronting web server (nginx/Apache) stream report files when it supports X-Sendfile
+app.config['USE_X_SENDFILE'] = os.environ.get('USE_X_SENDFILE', '').lower() in ('1', 'true')
 reports = {}  # Store report status: {report_id: {"status": "Running"/"Complete", "file_path": path_to_csv}}
 
 # Initialize database
@@ -25,73 +30,132 @@ logging.info("Initializing database...")
 init_db()
 logging.info("Database initialized")
 
+# Up to REPORT_WORKERS reports run at once, each in its own worker process, and each
+# report spreads its stores over its share of the CPUs so the two levels don't multiply
+cpu_count = os.cpu_count() or 1
+try:
+    report_workers = int(os.environ.get('REPORT_WORKERS', 2))
+except ValueError:
+    logging.warning(f"Invalid REPORT_WORKERS value {os.environ['REPORT_WORKERS']!r}, using 2")
+    report_workers = 2
+report_workers = max(1, min(report_workers, cpu_count))
+
 # Initialize services
 logging.info("Initializing services...")
 data_service = DataService(use_minimal_logging=True)
-report_service = ReportService(data_service, use_minimal_logging=True)
+report_service = ReportService(data_service, use_minimal_logging=True, n_workers=cpu_count // report_workers)
+data_lock = threading.Lock()
 logging.info("Services initialized")
 
+# Report generation is CPU-bound, so it runs in worker processes rather than
+# a thread where it would compete with request handling for the GIL. The workers
+# are spawned rather than forked: forking a threaded server (e.g. gunicorn gthread)
+# can copy locks held by other threads and deadlock
+def _create_executor():
+    return ProcessPoolExecutor(max_workers=report_workers, mp_context=multiprocessing.get_context('spawn'))
+
+executor = _create_executor()
+executor_lock = threading.Lock()
+
+def ensure_data_loaded():
+    """Load data once per server process, also when started by a WSGI server instead of app.py"""
+    with data_lock:
+        if data_service.current_time is None:
+            data_service.load_data()
+
+def _submit_report(report_id, output_file):
+    """Submit a report to the worker pool, replacing the pool if a dead worker has broken it"""
+    global executor
+    with executor_lock:
+        try:
+            return executor.submit(_generate_report, report_id, output_file)
+        except BrokenProcessPool:
+            logging.warning("Report worker pool is broken, starting a new one")
+            executor.shutdown(wait=False)
+            executor = _create_executor()
+            return executor.submit(_generate_report, report_id, output_file)
+
+def _generate_report(report_id, output_file):
+    """Generate a report in a worker process and return the output file path"""
+    # Workers started with the spawn method don't inherit the loaded data
+    if data_service.current_time is None:
+        data_service.load_data()
+    
+    logging.info(f"Starting report generation for report_id: {report_id}")
+    print(f"\n=== STARTING REPORT GENERATION: {report_id} ===")
+    
+    # Generate the report
+    logging.info(f"Calling report service to generate report: {report_id}")
+    print(f"Generating report file: {output_file}")
+    print(f"Current time (max timestamp in data): {data_service.current_time}")
+    
+    # Check if data is fully loaded
+    store_count = len(data_service.get_all_store_ids())
+    status_count, hours_count, timezone_count = data_service.get_record_counts()
+    
+    print(f"\nDATA SUMMARY:")
+    print(f"- Total stores: {store_count}")
+    print(f"- Total status records: {status_count}")
+    print(f"- Total business hours records: {hours_count}")
+    print(f"- Total timezone records: {timezone_count}")
+    
+    if status_count == 0:
+        print("\n⚠️ WARNING: No status data found! Report will be empty.")
+    elif hours_count == 0:
+        print("\n⚠️ WARNING: No business hours data found! Using 24/7 for all stores.")
+    elif timezone_count == 0:
+        print("\n⚠️ WARNING: No timezone data found! Using default timezone.")
+        
+    print("\nStarting report generation process...")
+    report_service.generate_report(output_file)
+    return output_file
+
 @app.route('/trigger_report', methods=['GET'])
 def trigger_report():
     logging.info(f"Received request to trigger report at {datetime.now()}")
     report_id = str(uuid.uuid4())
-    reports[report_id] = {"status": "Running", "file_path": None}
     logging.info(f"Generated report_id: {report_id}")
     
-    # Start report generation in a separate thread
-    def generate_report():
+    # Normally a no-op, since data is loaded at startup (see gunicorn.conf.py)
+    try:
+        ensure_data_loaded()
+    except Exception as e:
+        logging.error(f"Error loading data for report {report_id}: {str(e)}")
+        reports[report_id] = {"status": "Error", "error": str(e)}
+        return jsonify({"report_id": report_id})
+    reports[report_id] = {"status": "Running", "file_path": None}
+    
+    os.makedirs('reports', exist_ok=True)
+    logging.info(f"Reports directory created/confirmed")
+    output_file = os.path.join('reports', f'{report_id}.csv')
+    
+    # Update the report status once the worker finishes
+    def on_report_done(future):
         try:
-            logging.info(f"Starting report generation for report_id: {report_id}")
-            print(f"\n=== STARTING REPORT GENERATION: {report_id} ===")
-            os.makedirs('reports', exist_ok=True)
-            logging.info(f"Reports directory created/confirmed")
-            output_file = os.path.join('reports', f'{report_id}.csv')
-            
-            # Generate the report
-            logging.info(f"Calling report service to generate report: {report_id}")
-            print(f"Generating report file: {output_file}")
-            print(f"Current time (max timestamp in data): {data_service.current_time}")
-            
-            # Check if data is fully loaded
-            store_count = len(data_service.get_all_store_ids())
-            status_count = data_service.session.query(StoreStatus).count()
-            hours_count = data_service.session.query(BusinessHours).count()
-            timezone_count = data_service.session.query(StoreTimezone).count()
-            
-            print(f"\nDATA SUMMARY:")
-            print(f"- Total stores: {store_count}")
-            print(f"- Total status records: {status_count}")
-            print(f"- Total business hours records: {hours_count}")
-            print(f"- Total timezone records: {timezone_count}")
-            
-            if status_count == 0:
-                print("\n⚠️ WARNING: No status data found! Report will be empty.")
-            elif hours_count == 0:
-                print("\n⚠️ WARNING: No business hours data found! Using 24/7 for all stores.")
-            elif timezone_count == 0:
-                print("\n⚠️ WARNING: No timezone data found! Using default timezone.")
-                
-            print("\nStarting report generation process...")
-            report_service.generate_report(output_file)
-            
-            # Update the report status
-            logging.info(f"Report generation completed for report_id: {report_id}")
-            print(f"\n✅ REPORT GENERATION COMPLETED: {report_id}")
-            print(f"Report saved to: {output_file}")
-            
-            reports[report_id] = {"status": "Complete", "file_path": output_file}
-            logging.info(f"Updated report status to Complete for report_id: {report_id}")
+            future.result()
         except Exception as e:
             logging.error(f"Error generating report {report_id}: {str(e)}")
             print(f"\n❌ ERROR GENERATING REPORT: {str(e)}")
             reports[report_id] = {"status": "Error", "error": str(e)}
+            return
+        
+        logging.info(f"Report generation completed for report_id: {report_id}")
+        print(f"\n✅ REPORT GENERATION COMPLETED: {report_id}")
+        print(f"Report saved to: {output_file}")
+        
+        reports[report_id] = {"status": "Complete", "file_path": output_file}
+        logging.info(f"Updated report status to Complete for report_id: {report_id}")
     
-    # Start the thread
-    logging.info(f"Starting background thread for report_id: {report_id}")
-    thread = threading.Thread(target=generate_report)
-    thread.daemon = True
-    thread.start()
-    logging.info(f"Background thread started for report_id: {report_id}")
+    # Start report generation in a worker process
+    logging.info(f"Submitting report generation for report_id: {report_id}")
+    try:
+        future = _submit_report(report_id, output_file)
+    except Exception as e:
+        logging.error(f"Error submitting report {report_id}: {str(e)}")
+        reports[report_id] = {"status": "Error", "error": str(e)}
+        return jsonify({"report_id": report_id})
+    future.add_done_callback(on_report_done)
+    logging.info(f"Report generation submitted for report_id: {report_id}")
     
     return jsonify({"report_id": report_id})
 
@@ -131,7 +195,7 @@ if __name__ == '__main__':
     logging.info("Starting application...")
     logging.info("Loading data on startup...")
     print("Starting application - check store_monitoring.log for detailed logs")
-    data_service.load_data()
+    ensure_data_loaded()
     logging.info("Data loaded, starting Flask server...")
     print("Data loaded, starting Flask server on port 5000")
     app.run(debug=False, port=5000) 
\ No newline at end of file
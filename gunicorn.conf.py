@@ -0,0 +1,6 @@
+# Gunicorn settings, read automatically when gunicorn is started from this directory
+
+def post_worker_init(worker):
+    # Load the data when the worker starts rather than in its first /trigger_report request
+    from app import ensure_data_loaded
+    ensure_data_loaded()
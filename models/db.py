@@ -1,20 +1,38 @@
-from sqlalchemy import create_engine, Column, Integer, String, Float, DateTime, ForeignKey
+from sqlalchemy import create_engine, event, Column, Index, Integer, SmallInteger, String, Float, DateTime, ForeignKey
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import scoped_session, sessionmaker
 
 Base = declarative_base()
 
 # Create SQLite engine
 engine = create_engine('sqlite:///store_monitoring.db')
-Session = sessionmaker(bind=engine)
+# Thread-local sessions so threaded servers (e.g. gunicorn gthread) don't share one
+Session = scoped_session(sessionmaker(bind=engine))
+
+@event.listens_for(engine, 'connect')
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    # WAL + synchronous=NORMAL avoids an fsync per commit; the larger page cache
+    # (~200 MB) and in-memory temp store speed up bulk loads and index builds
+    cursor = dbapi_connection.cursor()
+    cursor.execute('PRAGMA journal_mode=WAL')
+    cursor.execute('PRAGMA synchronous=NORMAL')
+    cursor.execute('PRAGMA cache_size=-200000')
+    cursor.execute('PRAGMA temp_store=MEMORY')
+    cursor.close()
 
 class StoreStatus(Base):
     __tablename__ = 'store_status'
     
+    # Lookups filter on store_id and range/sort on timestamp_utc, so one
+    # composite index covers them
+    __table_args__ = (
+        Index('ix_store_status_store_ts', 'store_id', 'timestamp_utc'),
+    )
+    
     id = Column(Integer, primary_key=True)
-    store_id = Column(String, index=True)
-    timestamp_utc = Column(DateTime, index=True)
-    status = Column(String)  # 'active' or 'inactive'
+    store_id = Column(String)
+    timestamp_utc = Column(DateTime)
+    status = Column(SmallInteger)  # 1 = active, 0 = inactive
 
 class BusinessHours(Base):
     __tablename__ = 'business_hours'
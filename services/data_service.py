@@ -1,18 +1,44 @@
+import numpy as np
 import pandas as pd
-import pytz
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pv
+from collections import defaultdict, namedtuple
 from datetime import datetime, timedelta
-from sqlalchemy import func, or_
+from multiprocessing import shared_memory
+from sqlalchemy import func, or_, select
 import os
 import logging
 
-from models.db import Session, StoreStatus, BusinessHours, StoreTimezone
+from models.db import engine, Session, StoreStatus, BusinessHours, StoreTimezone
+
+# On-disk copy of the in-memory status arrays, keyed on the store_status contents
+STATUS_SNAPSHOT_PATH = 'store_status_cache.npz'
+
+# Lightweight stand-in for StoreStatus rows served from the in-memory cache.
+# status keeps the stored code: 1 = active, 0 = inactive
+StatusRecord = namedtuple('StatusRecord', ['timestamp_utc', 'status'])
+# start_s/end_s are start_time_local/end_time_local parsed into seconds of the day
+BusinessHoursRecord = namedtuple(
+    'BusinessHoursRecord',
+    ['day_of_week', 'start_time_local', 'end_time_local', 'start_s', 'end_s']
+)
 
 
 class DataService:
     def __init__(self, use_minimal_logging=False):
-        self.session = Session()
         self.default_timezone = 'America/Chicago'
         self._current_time = None  # Will be set to max timestamp in store_status
+        self._first_timestamp = None  # Will be set to min timestamp in store_status
+        # Status records for all stores in flat arrays, sorted by store then time.
+        # Store i's records are the slice _store_offsets[i]:_store_offsets[i + 1].
+        self._status_ts = np.empty(0, dtype='datetime64[ns]')
+        self._status_codes = np.empty(0, dtype=np.uint8)
+        self._store_offsets = np.zeros(1, dtype=np.int64)
+        self._store_ids = []
+        self._status_by_store = {}  # {store_id: (timestamps view, status codes view)}
+        self._timezone_by_store = {}  # {store_id: timezone_str}
+        self._hours_by_store = {}  # {store_id: [BusinessHoursRecord, ...]}
         self.use_minimal_logging = use_minimal_logging
         if not use_minimal_logging:
             print("DataService initialized")
@@ -24,8 +50,17 @@ class DataService:
         if not self.use_minimal_logging:
             print("Starting data loading process...")
         
-        # Only load if tables are empty
-        status_count = self.session.query(StoreStatus).count()
+        # Bring store_status from older databases up to date first, so CSV loads into
+        # an empty table also get the integer status column
+        self._migrate_status_encoding()
+        self._ensure_status_indexes()
+        
+        # Count all three tables in one round-trip; each is only loaded if empty
+        status_count, hours_count, timezone_count = self.session.execute(select(
+            select(func.count()).select_from(StoreStatus).scalar_subquery(),
+            select(func.count()).select_from(BusinessHours).scalar_subquery(),
+            select(func.count()).select_from(StoreTimezone).scalar_subquery()
+        )).one()
         logging.info(f"Current StoreStatus records: {status_count}")
         if not self.use_minimal_logging:
             print(f"Current StoreStatus records: {status_count}")
@@ -37,7 +72,6 @@ class DataService:
             if not self.use_minimal_logging:
                 print("StoreStatus data already loaded, skipping...")
         
-        hours_count = self.session.query(BusinessHours).count()
         logging.info(f"Current BusinessHours records: {hours_count}")
         if not self.use_minimal_logging:
             print(f"Current BusinessHours records: {hours_count}")
@@ -49,7 +83,6 @@ class DataService:
             if not self.use_minimal_logging:
                 print("BusinessHours data already loaded, skipping...")
         
-        timezone_count = self.session.query(StoreTimezone).count()
         logging.info(f"Current StoreTimezone records: {timezone_count}")
         if not self.use_minimal_logging:
             print(f"Current StoreTimezone records: {timezone_count}")
@@ -61,20 +94,33 @@ class DataService:
             if not self.use_minimal_logging:
                 print("StoreTimezone data already loaded, skipping...")
         
-        # Set current time to the max timestamp in store_status
-        max_timestamp = self.session.query(func.max(StoreStatus.timestamp_utc)).scalar()
+        # Set current time to the max timestamp in store_status, counting statuses
+        # for the stats below and summarizing the table for the snapshot key in the same scan
+        (max_timestamp, total_records, active_records,
+         min_timestamp, max_id, store_id_chars) = self.session.execute(select(
+            func.max(StoreStatus.timestamp_utc),
+            func.count(),
+            func.coalesce(func.sum(StoreStatus.status), 0),
+            func.min(StoreStatus.timestamp_utc),
+            func.max(StoreStatus.id),
+            func.coalesce(func.sum(func.length(StoreStatus.store_id)), 0)
+        )).one()
         self._current_time = max_timestamp
         logging.info(f"Current time set to: {self._current_time}")
         if not self.use_minimal_logging:
             print(f"Current time set to: {self._current_time}")
         
         # Print some stats for troubleshooting
-        active_records = self.session.query(StoreStatus).filter(StoreStatus.status == 'active').count()
-        inactive_records = self.session.query(StoreStatus).filter(StoreStatus.status == 'inactive').count()
+        inactive_records = total_records - active_records
         logging.info(f"Active status records: {active_records}, Inactive status records: {inactive_records}")
         if not self.use_minimal_logging:
             print(f"Active status records: {active_records}, Inactive status records: {inactive_records}")
         
+        self._load_status_cache(
+            (max_id, total_records, active_records, store_id_chars, min_timestamp, max_timestamp)
+        )
+        self._load_lookup_caches()
+        
         logging.info("Data loading process completed")
         if not self.use_minimal_logging:
             print("Data loading process completed")
@@ -85,46 +131,79 @@ class DataService:
         if not self.use_minimal_logging:
             print("Loading store status data...")
             
-        # Use chunksize for large file
+        # Insert in chunks of this many rows
         chunk_size = 100000
         file_path = os.path.join('data', 'store_status.csv')
         
+        # Parse the whole file with Arrow's multi-threaded CSV reader
+        table = pv.read_csv(file_path, convert_options=pv.ConvertOptions(
+            column_types={'store_id': pa.string(), 'status': pa.string(), 'timestamp_utc': pa.string()}
+        ))
+        
+        # Rewrite timestamps like '2023-01-22 12:09:39.388884 UTC' into the format
+        # SQLAlchemy uses for DateTime in SQLite, so rows can be inserted without
+        # per-row datetime conversion (%S includes the microseconds for 'us' units)
+        timestamps = pc.cast(pc.replace_substring(table['timestamp_utc'], ' UTC', ''), pa.timestamp('us'))
+        table = table.set_column(
+            table.schema.get_field_index('timestamp_utc'),
+            'timestamp_utc',
+            pc.strftime(timestamps, format='%Y-%m-%d %H:%M:%S')
+        )
+        
         chunk_count = 0
         total_records = 0
         active_count = 0
         inactive_count = 0
         
-        for chunk in pd.read_csv(file_path, chunksize=chunk_size):
-            chunk_count += 1
-            records_in_chunk = len(chunk)
-            total_records += records_in_chunk
-            
-            # Count active/inactive statuses
-            active_in_chunk = (chunk['status'] == 'active').sum()
-            inactive_in_chunk = (chunk['status'] == 'inactive').sum()
-            active_count += active_in_chunk
-            inactive_count += inactive_in_chunk
-            
-            logging.info(f"Processing chunk {chunk_count} with {records_in_chunk} records (active: {active_in_chunk}, inactive: {inactive_in_chunk})...")
-            if not self.use_minimal_logging:
-                print(f"Processing chunk {chunk_count} with {records_in_chunk} records (active: {active_in_chunk}, inactive: {inactive_in_chunk})...")
+        # Load everything in a single transaction. Indexes are dropped for the
+        # duration of the load and rebuilt once at the end, since per-row index
+        # maintenance is the main cost of inserting into SQLite.
+        with engine.connect() as conn:
+            # The load is all-or-nothing anyway, so skip fsyncs until it is done.
+            # SQLite only accepts this outside a transaction.
+            conn.exec_driver_sql('PRAGMA synchronous=OFF')
+            conn.commit()
+            try:
+                with conn.begin():
+                    for index in StoreStatus.__table__.indexes:
+                        index.drop(conn, checkfirst=True)
             
-            chunk['timestamp_utc'] = pd.to_datetime(chunk['timestamp_utc'], utc=True)
-            
-            # Convert DataFrame to list of dictionaries
-            records = chunk.to_dict('records')
-            
-            # Bulk insert
-            logging.info(f"Inserting chunk {chunk_count} into database...")
-            if not self.use_minimal_logging:
-                print(f"Inserting chunk {chunk_count} into database...")
+                    for offset in range(0, table.num_rows, chunk_size):
+                        chunk = table.slice(offset, chunk_size).to_pandas()
+                        chunk_count += 1
+                        records_in_chunk = len(chunk)
+                        total_records += records_in_chunk
+                
+                        # Encode status as 1 = active, 0 = inactive and count each
+                        chunk['status'] = (chunk['status'].to_numpy() == 'active').astype(np.uint8)
+                        active_in_chunk = int(chunk['status'].sum())
+                        inactive_in_chunk = records_in_chunk - active_in_chunk
+                        active_count += active_in_chunk
+                        inactive_count += inactive_in_chunk
+                
+                        logging.info(f"Processing chunk {chunk_count} with {records_in_chunk} records (active: {active_in_chunk}, inactive: {inactive_in_chunk})...")
+                        if not self.use_minimal_logging:
+                            print(f"Processing chunk {chunk_count} with {records_in_chunk} records (active: {active_in_chunk}, inactive: {inactive_in_chunk})...")
+                
+                        # Bulk insert
+                        logging.info(f"Inserting chunk {chunk_count} into database...")
+                        if not self.use_minimal_logging:
+                            print(f"Inserting chunk {chunk_count} into database...")
+                    
+                        chunk.to_sql('store_status', conn, if_exists='append', index=False)
                 
-            self.session.bulk_insert_mappings(StoreStatus, records)
-            self.session.commit()
+                        logging.info(f"Chunk {chunk_count} inserted into database")
+                        if not self.use_minimal_logging:
+                            print(f"Chunk {chunk_count} inserted into database")
             
-            logging.info(f"Chunk {chunk_count} committed to database")
-            if not self.use_minimal_logging:
-                print(f"Chunk {chunk_count} committed to database")
+                    logging.info("Rebuilding store status indexes...")
+                    if not self.use_minimal_logging:
+                        print("Rebuilding store status indexes...")
+                    for index in StoreStatus.__table__.indexes:
+                        index.create(conn)
+            finally:
+                conn.exec_driver_sql('PRAGMA synchronous=NORMAL')
+                conn.commit()
         
         logging.info(f"Store status data loaded successfully. Total records: {total_records}")
         logging.info(f"Status distribution - Active: {active_count}, Inactive: {inactive_count}")
@@ -132,6 +211,207 @@ class DataService:
             print(f"Store status data loaded successfully. Total records: {total_records}")
             print(f"Status distribution - Active: {active_count}, Inactive: {inactive_count}")
 
+    def _migrate_status_encoding(self):
+        """Rebuild store_status with an integer status column in databases created before status was stored as 1/0"""
+        with engine.begin() as conn:
+            # Only databases created before then declare status as a string column
+            column_types = {row[1]: row[2].upper() for row in conn.exec_driver_sql('PRAGMA table_info(store_status)')}
+            if 'INT' in column_types.get('status', 'INT'):
+                return
+            
+            logging.info("Rebuilding store status table with integer status codes...")
+            if not self.use_minimal_logging:
+                print("Rebuilding store status table with integer status codes...")
+            
+            # SQLite can't change a column's type in place, so copy the rows into a new
+            # table, re-encoding status on the way ('1' covers rows re-encoded as text).
+            # The old table's indexes go with it; the new one's are built after the copy
+            conn.exec_driver_sql('ALTER TABLE store_status RENAME TO store_status_legacy')
+            # Index names are database-wide, so free any the old table already uses
+            for index in StoreStatus.__table__.indexes:
+                conn.exec_driver_sql(f'DROP INDEX IF EXISTS {index.name}')
+            StoreStatus.__table__.create(conn)
+            for index in StoreStatus.__table__.indexes:
+                index.drop(conn)
+            migrated = conn.exec_driver_sql(
+                "INSERT INTO store_status (id, store_id, timestamp_utc, status) "
+                "SELECT id, store_id, timestamp_utc, CASE WHEN status IN ('active', '1') THEN 1 ELSE 0 END "
+                "FROM store_status_legacy"
+            ).rowcount
+            conn.exec_driver_sql('DROP TABLE store_status_legacy')
+            for index in StoreStatus.__table__.indexes:
+                index.create(conn)
+        
+        logging.info(f"Re-encoded {migrated} store status records as 1 = active, 0 = inactive")
+        if not self.use_minimal_logging:
+            print(f"Re-encoded {migrated} store status records as 1 = active, 0 = inactive")
+
+    def _ensure_status_indexes(self):
+        """Give existing store_status tables the composite index in place of the single-column ones"""
+        # create_all doesn't add indexes to tables that already exist
+        with engine.begin() as conn:
+            for index in StoreStatus.__table__.indexes:
+                index.create(conn, checkfirst=True)
+            for name in ('ix_store_status_store_id', 'ix_store_status_timestamp_utc'):
+                conn.exec_driver_sql(f'DROP INDEX IF EXISTS {name}')
+
+    def _load_status_cache(self, table_summary):
+        """Load all store status records into flat arrays grouped by store"""
+        # Reuse the arrays saved by a previous run if store_status has not changed since.
+        # The summary covers the row count and ids, status and store id totals and the time
+        # span, so a database rebuilt from a different CSV doesn't match an old snapshot
+        snapshot_key = np.array([str(value) for value in table_summary])
+        if self._load_status_snapshot(snapshot_key):
+            return
+        
+        logging.info("Building in-memory store status cache...")
+        if not self.use_minimal_logging:
+            print("Building in-memory store status cache...")
+        
+        # Plain column scan: timestamps come back as text and are parsed in one
+        # vectorized pass, status is already stored as 1 = active, 0 = inactive
+        df = pd.read_sql_query(
+            "SELECT store_id, timestamp_utc, status FROM store_status",
+            engine,
+            dtype={'status': np.uint8}
+        )
+        df['timestamp_utc'] = pd.to_datetime(df['timestamp_utc'], format='ISO8601')
+        df = df.sort_values(['store_id', 'timestamp_utc'], kind='stable')
+        
+        store_ids = df['store_id'].to_numpy()
+        self._status_ts = df['timestamp_utc'].to_numpy()
+        self._status_codes = df['status'].to_numpy()
+        boundaries = np.flatnonzero(store_ids[1:] != store_ids[:-1]) + 1
+        self._store_offsets = np.concatenate(([0], boundaries, [len(df)])) if len(df) else np.zeros(1, dtype=np.int64)
+        self._store_ids = store_ids[self._store_offsets[:-1]].tolist()
+        self._index_status_cache()
+        self._save_status_snapshot(snapshot_key)
+        
+        logging.info(f"Status cache built for {len(self._status_by_store)} stores")
+        if not self.use_minimal_logging:
+            print(f"Status cache built for {len(self._status_by_store)} stores")
+
+    def _index_status_cache(self):
+        """Derive the first timestamp and per-store views from the flat status arrays"""
+        self._first_timestamp = self._status_ts.min().astype('datetime64[us]').item() if len(self._status_ts) else None
+        
+        # Per-store views into the flat arrays (no copies)
+        self._status_by_store = {
+            store_id: (self._status_ts[start:end], self._status_codes[start:end])
+            for store_id, start, end in zip(self._store_ids, self._store_offsets[:-1].tolist(), self._store_offsets[1:].tolist())
+        }
+
+    def _load_status_snapshot(self, snapshot_key):
+        """Load the status arrays from the on-disk snapshot if it matches the database"""
+        if not os.path.exists(STATUS_SNAPSHOT_PATH):
+            return False
+        try:
+            with np.load(STATUS_SNAPSHOT_PATH) as snapshot:
+                if not np.array_equal(snapshot['key'], snapshot_key):
+                    return False
+                self._status_ts = snapshot['timestamps']
+                self._status_codes = snapshot['statuses']
+                self._store_offsets = snapshot['offsets']
+                self._store_ids = snapshot['store_ids'].tolist()
+        except Exception as e:
+            logging.warning(f"Ignoring unreadable status snapshot {STATUS_SNAPSHOT_PATH}: {str(e)}")
+            return False
+        self._index_status_cache()
+        
+        logging.info(f"Status cache loaded from snapshot for {len(self._status_by_store)} stores")
+        if not self.use_minimal_logging:
+            print(f"Status cache loaded from snapshot for {len(self._status_by_store)} stores")
+        return True
+
+    def _save_status_snapshot(self, snapshot_key):
+        """Write the status arrays to disk so the next startup can skip the database scan"""
+        try:
+            # Write to a temp file first so a concurrent reader never sees a partial snapshot
+            tmp_path = f"{STATUS_SNAPSHOT_PATH}.{os.getpid()}.tmp.npz"
+            np.savez(
+                tmp_path,
+                key=snapshot_key,
+                timestamps=self._status_ts,
+                statuses=self._status_codes,
+                offsets=self._store_offsets,
+                store_ids=np.array(self._store_ids, dtype=str)
+            )
+            os.replace(tmp_path, STATUS_SNAPSHOT_PATH)
+        except OSError as e:
+            logging.warning(f"Could not write status snapshot {STATUS_SNAPSHOT_PATH}: {str(e)}")
+
+    def share_status_cache(self):
+        """Copy the status arrays into shared memory for report worker processes"""
+        # Returns a picklable description of the loaded data for attach_shared_status_cache,
+        # and the shared memory blocks, which the caller must close and unlink when done
+        blocks = []
+        arrays = {}
+        for name in ('_status_ts', '_status_codes', '_store_offsets'):
+            array = getattr(self, name)
+            block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+            np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[:] = array
+            blocks.append(block)
+            arrays[name] = (block.name, array.shape, array.dtype.str)
+        
+        shared_state = {
+            'arrays': arrays,
+            'store_ids': self._store_ids,
+            'current_time': self._current_time,
+            'timezone_by_store': self._timezone_by_store,
+            'hours_by_store': self._hours_by_store
+        }
+        return shared_state, blocks
+
+    def attach_shared_status_cache(self, shared_state):
+        """Use status arrays shared by another process instead of loading them from the database"""
+        # Keep the blocks referenced for as long as the arrays are in use
+        self._shared_blocks = []
+        for name, (block_name, shape, dtype) in shared_state['arrays'].items():
+            block = shared_memory.SharedMemory(name=block_name)
+            self._shared_blocks.append(block)
+            setattr(self, name, np.ndarray(shape, dtype=dtype, buffer=block.buf))
+        
+        self._store_ids = shared_state['store_ids']
+        self._current_time = shared_state['current_time']
+        self._timezone_by_store = shared_state['timezone_by_store']
+        self._hours_by_store = shared_state['hours_by_store']
+        self._index_status_cache()
+
+    def _load_lookup_caches(self):
+        """Load timezones and business hours into per-store dictionaries"""
+        logging.info("Building timezone and business hours lookups...")
+        if not self.use_minimal_logging:
+            print("Building timezone and business hours lookups...")
+        
+        self._timezone_by_store = dict(
+            self.session.query(StoreTimezone.store_id, StoreTimezone.timezone_str).all()
+        )
+        
+        hours = pd.read_sql_query(
+            'SELECT store_id, day_of_week, start_time_local, end_time_local FROM business_hours ORDER BY id',
+            engine
+        )
+        hours_by_store = defaultdict(list)
+        if not hours.empty:
+            # Parse HH:MM:SS strings once into seconds of the day
+            for column, parsed in (('start_time_local', 'start_s'), ('end_time_local', 'end_s')):
+                hours[parsed] = hours[column].str.split(':', expand=True).astype(int).dot([3600, 60, 1])
+            
+            columns = ['store_id', 'day_of_week', 'start_time_local', 'end_time_local', 'start_s', 'end_s']
+            for store_id, *fields in zip(*(hours[column].tolist() for column in columns)):
+                hours_by_store[store_id].append(BusinessHoursRecord(*fields))
+        self._hours_by_store = dict(hours_by_store)
+        
+        logging.info(f"Lookups built: {len(self._timezone_by_store)} timezones, {len(self._hours_by_store)} stores with business hours")
+        if not self.use_minimal_logging:
+            print(f"Lookups built: {len(self._timezone_by_store)} timezones, {len(self._hours_by_store)} stores with business hours")
+
+    def _to_status_records(self, timestamps, statuses, indices):
+        """Convert cached array positions into StatusRecord tuples"""
+        times = timestamps[indices].astype('datetime64[us]').tolist()
+        codes = statuses[indices].tolist()
+        return [StatusRecord(timestamp, code) for timestamp, code in zip(times, codes)]
+
     def _load_business_hours(self):
         """Load business hours data from CSV"""
         logging.info("Loading business hours data...")
@@ -195,169 +475,165 @@ class DataService:
 
     def get_store_timezone(self, store_id):
         """Get timezone for a store"""
-        logging.debug(f"Fetching timezone for store_id: {store_id}")
-        timezone_record = self.session.query(StoreTimezone).filter_by(store_id=store_id).first()
-        if timezone_record:
-            logging.debug(f"Found timezone for store {store_id}: {timezone_record.timezone_str}")
-            return timezone_record.timezone_str
-        logging.debug(f"No timezone found for store {store_id}, using default: {self.default_timezone}")
+        logging.debug("Fetching timezone for store_id: %s", store_id)
+        if store_id in self._timezone_by_store:
+            logging.debug("Found timezone for store %s: %s", store_id, self._timezone_by_store[store_id])
+            return self._timezone_by_store[store_id]
+        logging.debug("No timezone found for store %s, using default: %s", store_id, self.default_timezone)
         return self.default_timezone
 
     def get_business_hours(self, store_id):
         """Get business hours for a store"""
-        logging.debug(f"Fetching business hours for store_id: {store_id}")
-        hours = self.session.query(BusinessHours).filter_by(store_id=store_id).all()
+        logging.debug("Fetching business hours for store_id: %s", store_id)
+        hours = self._hours_by_store.get(store_id)
         if hours:
-            logging.debug(f"Found {len(hours)} business hour records for store {store_id}")
-            # Debug: print some of the hours
-            if len(hours) > 0 and not self.use_minimal_logging:
-                sample = hours[0]
-                logging.debug(f"Sample hours for day {sample.day_of_week}: {sample.start_time_local} to {sample.end_time_local}")
+            logging.debug("Found %s business hour records for store %s", len(hours), store_id)
             return hours
         # If no hours found, assume 24/7
-        logging.debug(f"No business hours found for store {store_id}, generating 24/7 hours")
+        logging.debug("No business hours found for store %s, generating 24/7 hours", store_id)
         return self._generate_24_7_hours(store_id)
 
     def _generate_24_7_hours(self, store_id):
         """Generate 24/7 business hours for a store"""
-        all_days = []
-        for day in range(7):
-            all_days.append({
-                'store_id': store_id,
-                'day_of_week': day,
-                'start_time_local': '00:00:00',
-                'end_time_local': '23:59:59'
-            })
-        return all_days
+        return [BusinessHoursRecord(day, '00:00:00', '23:59:59', 0, 86399) for day in range(7)]
     
     def get_store_status_data(self, store_id, start_time, end_time):
-        """Get store status data for a specific time period"""
-        logging.debug(f"Fetching status data for store_id: {store_id} from {start_time} to {end_time}")
+        """Get store status data for a specific time period, ordered by timestamp"""
+        timestamps, statuses = self.get_store_status_arrays(store_id, start_time, end_time)
+        return self._to_status_records(timestamps, statuses, slice(None))
+    
+    def get_store_status_arrays(self, store_id, start_time, end_time):
+        """Get store status data for a specific time period as (timestamps, status codes) arrays, ordered by timestamp"""
+        logging.debug("Fetching status data for store_id: %s from %s to %s", store_id, start_time, end_time)
+        
+        if store_id not in self._status_by_store:
+            logging.debug("No status records cached for store %s", store_id)
+            return self._status_ts[:0], self._status_codes[:0]
+        timestamps, statuses = self._status_by_store[store_id]
         
         # Start with the specified time range
-        results = self.session.query(StoreStatus).filter(
-            StoreStatus.store_id == store_id,
-            StoreStatus.timestamp_utc >= start_time,
-            StoreStatus.timestamp_utc <= end_time
-        ).order_by(StoreStatus.timestamp_utc).all()
+        lo = timestamps.searchsorted(np.datetime64(start_time))
+        hi = timestamps.searchsorted(np.datetime64(end_time), side='right')
+        results = list(range(lo, hi))
         
-        logging.debug(f"Found {len(results)} status records for store {store_id} in the specified time range")
+        logging.debug("Found %s status records for store %s in the specified time range", len(results), store_id)
         
         # If we have enough data (at least 3 data points), return it
         if len(results) >= 3:
-            return results
+            return timestamps[lo:hi], statuses[lo:hi]
             
         # If we have at least one data point, that's better than nothing
         if len(results) > 0:
             # Check if we have at least one observation in each third of the time period
             # This would give us better coverage for interpolation
             time_range = end_time - start_time
-            first_third_end = start_time + time_range / 3
-            second_third_end = start_time + (time_range * 2) / 3
+            first_third_end = np.datetime64(start_time + time_range / 3)
+            second_third_end = np.datetime64(start_time + (time_range * 2) / 3)
             
             has_first_third = False
             has_second_third = False
             has_last_third = False
             
-            for record in results:
-                if record.timestamp_utc <= first_third_end:
+            for i in results:
+                if timestamps[i] <= first_third_end:
                     has_first_third = True
-                elif record.timestamp_utc <= second_third_end:
+                elif timestamps[i] <= second_third_end:
                     has_second_third = True
                 else:
                     has_last_third = True
             
             # If we have good coverage, no need to fetch more data
             if has_first_third and has_second_third and has_last_third:
-                logging.debug(f"Good temporal coverage with {len(results)} records for store {store_id}")
-                return results
+                logging.debug("Good temporal coverage with %s records for store %s", len(results), store_id)
+                return timestamps[lo:hi], statuses[lo:hi]
         
         # If we have few or no records in the range, expand our search
+        seen = set(results)
         
         # First, try to get the most recent record before the range
-        before_range = self.session.query(StoreStatus).filter(
-            StoreStatus.store_id == store_id,
-            StoreStatus.timestamp_utc < start_time
-        ).order_by(StoreStatus.timestamp_utc.desc()).first()
-        
-        if before_range:
-            logging.debug(f"Found record before range: {before_range.timestamp_utc}, status: {before_range.status}")
+        if lo > 0:
+            logging.debug("Found record before range: %s, status: %s", timestamps[lo - 1], statuses[lo - 1])
             # Only add if not already in results
-            if before_range not in results:
-                results.append(before_range)
+            if lo - 1 not in seen:
+                results.append(lo - 1)
+                seen.add(lo - 1)
         
         # Get the closest record after the range if necessary
-        if len(results) < 3:
-            after_range = self.session.query(StoreStatus).filter(
-                StoreStatus.store_id == store_id,
-                StoreStatus.timestamp_utc > end_time
-            ).order_by(StoreStatus.timestamp_utc).first()
-            
-            if after_range:
-                logging.debug(f"Found record after range: {after_range.timestamp_utc}, status: {after_range.status}")
-                if after_range not in results:
-                    results.append(after_range)
+        if len(results) < 3 and hi < len(timestamps):
+            logging.debug("Found record after range: %s, status: %s", timestamps[hi], statuses[hi])
+            if hi not in seen:
+                results.append(hi)
+                seen.add(hi)
         
         # If we still have few records, expand to include more history and future data
         if len(results) < 3:
-            # Look back up to 72 hours before the start time
+            # Look back up to 72 hours before the start time (at most 5 records)
             extended_start = start_time - timedelta(hours=72)
-            logging.debug(f"Looking for additional history from {extended_start} to {start_time}")
-            
-            additional_history = self.session.query(StoreStatus).filter(
-                StoreStatus.store_id == store_id,
-                StoreStatus.timestamp_utc >= extended_start,
-                StoreStatus.timestamp_utc < start_time
-            ).order_by(StoreStatus.timestamp_utc.desc()).limit(5).all()
+            logging.debug("Looking for additional history from %s to %s", extended_start, start_time)
             
-            if additional_history:
-                logging.debug(f"Found {len(additional_history)} additional historical records")
-                # Add in reverse order to maintain chronological order
-                for record in reversed(additional_history):
-                    if record not in results:
-                        results.append(record)
+            history_lo = max(timestamps.searchsorted(np.datetime64(extended_start)), lo - 5)
+            if history_lo < lo:
+                logging.debug("Found %s additional historical records", lo - history_lo)
+                for i in range(history_lo, lo):
+                    if i not in seen:
+                        results.append(i)
+                        seen.add(i)
             
-            # Look forward up to 72 hours after the end time
+            # Look forward up to 72 hours after the end time (at most 5 records)
             extended_end = end_time + timedelta(hours=72)
-            logging.debug(f"Looking for additional future data from {end_time} to {extended_end}")
+            logging.debug("Looking for additional future data from %s to %s", end_time, extended_end)
             
-            additional_future = self.session.query(StoreStatus).filter(
-                StoreStatus.store_id == store_id,
-                StoreStatus.timestamp_utc > end_time,
-                StoreStatus.timestamp_utc <= extended_end
-            ).order_by(StoreStatus.timestamp_utc).limit(5).all()
-            
-            if additional_future:
-                logging.debug(f"Found {len(additional_future)} additional future records")
-                for record in additional_future:
-                    if record not in results:
-                        results.append(record)
+            future_hi = min(timestamps.searchsorted(np.datetime64(extended_end), side='right'), hi + 5)
+            if future_hi > hi:
+                logging.debug("Found %s additional future records", future_hi - hi)
+                for i in range(hi, future_hi):
+                    if i not in seen:
+                        results.append(i)
+                        seen.add(i)
         
         # Finally, as a last resort, just get any data we have for this store
         if len(results) < 2:
-            logging.debug(f"Still insufficient data, fetching any available status for store {store_id}")
-            any_status = self.session.query(StoreStatus).filter(
-                StoreStatus.store_id == store_id
-            ).order_by(StoreStatus.timestamp_utc).limit(10).all()
-            
-            if any_status:
-                logging.debug(f"Found {len(any_status)} total records for store {store_id}")
-                for record in any_status:
-                    if record not in results:
-                        results.append(record)
-        
-        # Re-sort results by timestamp
-        results.sort(key=lambda x: x.timestamp_utc)
-        logging.debug(f"Returning {len(results)} total status records for store {store_id}")
-        
-        return results
+            logging.debug("Still insufficient data, fetching any available status for store %s", store_id)
+            any_hi = min(len(timestamps), 10)
+            logging.debug("Found %s total records for store %s", any_hi, store_id)
+            for i in range(any_hi):
+                if i not in seen:
+                    results.append(i)
+                    seen.add(i)
+        
+        # Re-sort results by timestamp (positions in the cache are already time-ordered)
+        results.sort()
+        logging.debug("Returning %s total status records for store %s", len(results), store_id)
+        
+        return timestamps[results], statuses[results]
+    
+    def get_all_status_windowed(self, start_time, end_time):
+        """Get status arrays for every store within a time period in a single pass"""
+        if not self._store_ids:
+            return {}
+        period_start = np.datetime64(start_time)
+        period_end = np.datetime64(end_time)
+        
+        # Count each store's records before and within the period with one
+        # vectorized pass over the flat arrays to get every store's slice bounds
+        store_starts = self._store_offsets[:-1]
+        lo = store_starts + np.add.reduceat(self._status_ts < period_start, store_starts, dtype=np.int64)
+        hi = store_starts + np.add.reduceat(self._status_ts <= period_end, store_starts, dtype=np.int64)
+        
+        return {
+            store_id: (self._status_ts[start:end], self._status_codes[start:end])
+            for store_id, start, end in zip(self._store_ids, lo.tolist(), hi.tolist())
+        }
+    
+    def has_status_data(self, store_id):
+        """Check whether a store has any status records at all"""
+        return store_id in self._status_by_store
     
     def get_all_store_ids(self):
         """Get all unique store IDs"""
         logging.info("Fetching all unique store IDs...")
-        # First try to get from store_status
-        store_ids = self.session.query(StoreStatus.store_id).distinct().all()
-        store_ids_list = [store[0] for store in store_ids]
+        # Every store with status data has an entry in the status cache
+        store_ids_list = list(self._status_by_store)
         logging.info(f"Found {len(store_ids_list)} unique store IDs")
         
         # For testing, you could limit to a smaller sample
@@ -367,6 +643,12 @@ class DataService:
         
         return store_ids_list
     
+    @property
+    def session(self):
+        """Get the calling thread's database session"""
+        # Resolved on each use, so threads sharing this service don't share a session
+        return Session()
+
     @property
     def current_time(self):
         """Get the current time (max timestamp in store_status)"""
@@ -374,31 +656,34 @@ class DataService:
         
     def get_latest_status_before_range(self, store_id, start_time):
         """Get the most recent status record before a given time"""
-        logging.debug(f"Fetching latest status before {start_time} for store_id: {store_id}")
+        logging.debug("Fetching latest status before %s for store_id: %s", start_time, store_id)
         
-        # Get the most recent record before the specified time
-        result = self.session.query(StoreStatus).filter(
-            StoreStatus.store_id == store_id,
-            StoreStatus.timestamp_utc < start_time
-        ).order_by(StoreStatus.timestamp_utc.desc()).first()
+        # Position of the most recent record before the specified time
+        result = None
+        if store_id in self._status_by_store:
+            timestamps, statuses = self._status_by_store[store_id]
+            i = timestamps.searchsorted(np.datetime64(start_time)) - 1
+            if i >= 0:
+                result = self._to_status_records(timestamps, statuses, [i])[0]
         
         if result:
-            logging.debug(f"Found status record before range: {result.timestamp_utc}, status: {result.status}")
+            logging.debug("Found status record before range: %s, status: %s", result.timestamp_utc, result.status)
         else:
-            logging.debug(f"No status records found before {start_time} for store {store_id}")
+            logging.debug("No status records found before %s for store %s", start_time, store_id)
             
         return result
         
     def get_first_timestamp(self):
         """Get the earliest timestamp in the store_status table"""
-        logging.debug("Fetching first timestamp in database")
-        
-        # Get the minimum timestamp
-        min_timestamp = self.session.query(func.min(StoreStatus.timestamp_utc)).scalar()
-        
-        if min_timestamp:
-            logging.debug(f"First timestamp in database: {min_timestamp}")
+        if self._first_timestamp:
+            logging.debug("First timestamp in database: %s", self._first_timestamp)
         else:
             logging.debug("No timestamps found in database")
             
-        return min_timestamp 
\ No newline at end of file
+        return self._first_timestamp
+    
+    def get_record_counts(self):
+        """Get the number of status, business hours and timezone records held in memory"""
+        status_count = len(self._status_ts)
+        hours_count = sum(len(hours) for hours in self._hours_by_store.values())
+        return status_count, hours_count, len(self._timezone_by_store)
\ No newline at end of file
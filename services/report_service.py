@@ -1,14 +1,60 @@
 import csv
-import pytz
-from datetime import datetime, timedelta
-import pandas as pd
+import io
+import math
+import multiprocessing
+import os
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, time, timedelta
+import numpy as np
 import logging
-from utils.time_utils import local_time_to_utc, get_local_time, is_within_business_hours
+from services.data_service import BusinessHoursRecord, DataService
+from utils.time_utils import local_time_to_utc, get_local_time, get_timezone, to_epoch_seconds
+
+# Any Monday, used to evaluate _is_business_time for a given weekday and time of day
+_REFERENCE_MONDAY = datetime(2024, 1, 1)
+
+# Unit (in seconds) business time is reported in for each report range, and the most
+# business time the range can hold: 60 minutes for an hour, 24 hours for a day, 168 hours for a week
+_RANGE_UNITS = {'hour': (60, 60), 'day': (3600, 24), 'week': (3600, 168)}
+
+# (report_service, week_status_by_store, report_times) for the report being generated. Set in
+# the parent before the worker processes are forked so they inherit it, or by
+# _init_shared_worker in workers that are not forked.
+_worker_context = None
+
+def _init_shared_worker(shared_state, use_minimal_logging):
+    """Set up a report worker process from the status arrays shared by the parent"""
+    global _worker_context
+    data_service = DataService(use_minimal_logging=use_minimal_logging)
+    data_service.attach_shared_status_cache(shared_state)
+    report_service = ReportService(data_service, use_minimal_logging=use_minimal_logging)
+    _worker_context = (
+        report_service, report_service._get_week_status_by_store(), report_service._get_report_times()
+    )
+
+def _calculate_store_metrics(store_id):
+    """Calculate metrics for a store inside a report worker process"""
+    report_service, week_status_by_store, report_times = _worker_context
+    return report_service._calculate_metrics(store_id, week_status_by_store.get(store_id), *report_times)
 
 class ReportService:
-    def __init__(self, data_service, use_minimal_logging=False):
+    # Business hours used for stores without usable hours of their own
+    HOURS_24_7 = tuple(BusinessHoursRecord(day, '00:00:00', '23:59:59', 0, 86399) for day in range(7))
+    STANDARD_HOURS = tuple(BusinessHoursRecord(day, '09:00:00', '21:00:00', 9 * 3600, 21 * 3600) for day in range(7))
+    
+    def __init__(self, data_service, use_minimal_logging=False, n_workers=None):
         self.data_service = data_service
         self.use_minimal_logging = use_minimal_logging
+        self.n_workers = n_workers or os.cpu_count() or 1
+        # UTC business intervals for the report's time range, shared by stores with the
+        # same hours and timezone and kept across reports over the same range:
+        # {(business hours tuple, timezone_str): (starts, ends)}
+        self._business_intervals_cache = {}
+        self._business_intervals_range = None
+        # Per-weekday business intervals, shared by stores with identical business hours:
+        # {business hours tuple: day intervals}
+        self._day_intervals_by_hours = {}
         if not use_minimal_logging:
             print("ReportService initialized")
         logging.info("ReportService initialized")
@@ -41,72 +87,79 @@ class ReportService:
             print(f"- Total time span: {last_timestamp - first_timestamp}")
             print(f"- Report will calculate metrics relative to: {last_timestamp}")
         
-        # Create CSV file
-        with open(output_file, 'w', newline='') as csvfile:
-            fieldnames = [
-                'store_id',
-                'uptime_last_hour(in minutes)',
-                'uptime_last_day(in hours)',
-                'uptime_last_week(in hours)',
-                'downtime_last_hour(in minutes)',
-                'downtime_last_day(in hours)',
-                'downtime_last_week(in hours)'
-            ]
-            writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-            writer.writeheader()
-            
-            # Process each store
-            stores_processed = 0
-            progress_marker = max(1, total_stores // 10)  # Show progress every 10%
-            
-            stats = {
-                'all_zeros': 0,
-                'active_stores': 0,
-                'inactive_stores': 0
-            }
-            
-            start_time = datetime.now()
-            print(f"\n REPORT GENERATION STARTED AT: {start_time}")
+        # Fetch every store's status data for the past week in one pass
+        week_status_by_store = self._get_week_status_by_store()
+        
+        # The report's time ranges are the same for every store
+        report_times = self._get_report_times()
+        
+        # Report columns
+        fieldnames = [
+            'store_id',
+            'uptime_last_hour(in minutes)',
+            'uptime_last_day(in hours)',
+            'uptime_last_week(in hours)',
+            'downtime_last_hour(in minutes)',
+            'downtime_last_day(in hours)',
+            'downtime_last_week(in hours)'
+        ]
+        # Rows are collected column-wise and written in one go at the end
+        columns = {name: [] for name in fieldnames}
+        
+        # Process each store
+        stores_processed = 0
+        progress_marker = max(1, total_stores // 10)  # Show progress every 10%
+        
+        stats = {
+            'all_zeros': 0,
+            'active_stores': 0,
+            'inactive_stores': 0
+        }
+        
+        start_time = datetime.now()
+        print(f"\n REPORT GENERATION STARTED AT: {start_time}")
+        
+        for metrics in self._iter_store_metrics(store_ids, week_status_by_store, report_times):
+            for name in fieldnames:
+                columns[name].append(metrics[name])
+            stores_processed += 1
             
-            for store_id in store_ids:
-                if stores_processed % 10 == 0:  # Only log every 10 stores to reduce output
-                    logging.info(f"Processing store {store_id} ({stores_processed+1}/{total_stores})")
-                    if not self.use_minimal_logging:
-                        print(f"Processing store {store_id} ({stores_processed+1}/{total_stores})")
-                
-                metrics = self._calculate_metrics(store_id)
-                writer.writerow(metrics)
-                stores_processed += 1
-                
-                # Update statistics
-                if (metrics['uptime_last_hour(in minutes)'] == 0 and 
-                    metrics['uptime_last_day(in hours)'] == 0 and 
-                    metrics['uptime_last_week(in hours)'] == 0):
-                    if (metrics['downtime_last_hour(in minutes)'] == 0 and 
-                        metrics['downtime_last_day(in hours)'] == 0 and 
-                        metrics['downtime_last_week(in hours)'] == 0):
-                        stats['all_zeros'] += 1
-                    else:
-                        stats['inactive_stores'] += 1
+            # Update statistics
+            if (metrics['uptime_last_hour(in minutes)'] == 0 and 
+                metrics['uptime_last_day(in hours)'] == 0 and 
+                metrics['uptime_last_week(in hours)'] == 0):
+                if (metrics['downtime_last_hour(in minutes)'] == 0 and 
+                    metrics['downtime_last_day(in hours)'] == 0 and 
+                    metrics['downtime_last_week(in hours)'] == 0):
+                    stats['all_zeros'] += 1
                 else:
-                    stats['active_stores'] += 1
-                
-                if stores_processed % progress_marker == 0 or stores_processed == total_stores:
-                    progress_pct = (stores_processed / total_stores) * 100
-                    elapsed = datetime.now() - start_time
-                    avg_time_per_store = elapsed / stores_processed
-                    estimated_remaining = avg_time_per_store * (total_stores - stores_processed)
-                    
-                    print(f"Progress: {progress_pct:.1f}% ({stores_processed}/{total_stores}) | " +
-                          f"Elapsed: {elapsed} | " +
-                          f"Est. remaining: {estimated_remaining}")
-                    print(f"Stats so far: Active: {stats['active_stores']}, " +
-                          f"Inactive: {stats['inactive_stores']}, " +
-                          f"All zeros: {stats['all_zeros']}")
-                    
-                    # Flush the file to ensure data is written
-                    csvfile.flush()
+                    stats['inactive_stores'] += 1
+            else:
+                stats['active_stores'] += 1
+            
+            if stores_processed % progress_marker == 0 or stores_processed == total_stores:
+                progress_pct = (stores_processed / total_stores) * 100
+                elapsed = datetime.now() - start_time
+                avg_time_per_store = elapsed / stores_processed
+                estimated_remaining = avg_time_per_store * (total_stores - stores_processed)
                 
+                # Progress is only reported at 10% intervals, as one write per update
+                print(f"Progress: {progress_pct:.1f}% ({stores_processed}/{total_stores}) | "
+                      f"Elapsed: {elapsed} | "
+                      f"Est. remaining: {estimated_remaining}\n"
+                      f"Stats so far: Active: {stats['active_stores']}, "
+                      f"Inactive: {stats['inactive_stores']}, "
+                      f"All zeros: {stats['all_zeros']}")
+                logging.info(f"Processed {stores_processed}/{total_stores} stores")
+        
+        # Format the CSV in memory, then write it to the file in one go
+        csv_buffer = io.StringIO()
+        writer = csv.writer(csv_buffer)
+        writer.writerow(fieldnames)
+        writer.writerows(zip(*columns.values()))
+        with open(output_file, 'w', newline='') as f:
+            f.write(csv_buffer.getvalue())
+        
         end_time = datetime.now()
         total_time = end_time - start_time
         
@@ -124,12 +177,19 @@ class ReportService:
             print(f"Report generation completed. Output file: {output_file}")
         return output_file
     
-    def _calculate_metrics(self, store_id):
-        """Calculate uptime/downtime metrics for a specific store"""
-        logging.debug(f"Calculating metrics for store: {store_id}")
-        
+    def _get_week_status_by_store(self):
+        """Get every store's status arrays for the past week"""
+        last_timestamp = self.data_service.current_time
+        if not last_timestamp:
+            return {}
+        return self.data_service.get_all_status_windowed(last_timestamp - timedelta(days=7), last_timestamp)
+    
+    def _get_report_times(self):
+        """Get the current time and the start of the last hour, day and week"""
         # Get current time from the data service (max timestamp in data)
         current_time = self.data_service.current_time
+        if current_time is None:
+            return None, None, None, None
         
         # Ensure current_time is a datetime object
         if isinstance(current_time, (int, float)):
@@ -139,11 +199,55 @@ class ReportService:
         last_hour_start = current_time - timedelta(hours=1)
         last_day_start = current_time - timedelta(days=1)
         last_week_start = current_time - timedelta(days=7)
+        return current_time, last_hour_start, last_day_start, last_week_start
+    
+    def _iter_store_metrics(self, store_ids, week_status_by_store, report_times):
+        """Yield metrics for each store in order, spreading the work over worker processes"""
+        if self.n_workers <= 1 or len(store_ids) < 2:
+            for store_id in store_ids:
+                yield self._calculate_metrics(store_id, week_status_by_store.get(store_id), *report_times)
+            return
+        
+        # Stores are sent to the workers in chunks of at most 64, with several
+        # chunks per worker so slow stores don't leave other workers idle
+        chunk_size = min(64, math.ceil(len(store_ids) / (self.n_workers * 4)))
+        logging.info(f"Calculating metrics in {self.n_workers} worker processes (chunks of {chunk_size} stores)")
+        
+        global _worker_context
+        # Forked workers inherit the loaded data, sharing the status arrays copy-on-write
+        if 'fork' in multiprocessing.get_all_start_methods():
+            _worker_context = (self, week_status_by_store, report_times)
+            try:
+                with ProcessPoolExecutor(max_workers=self.n_workers, mp_context=multiprocessing.get_context('fork')) as executor:
+                    yield from executor.map(_calculate_store_metrics, store_ids, chunksize=chunk_size)
+            finally:
+                _worker_context = None
+            return
+        
+        # Otherwise the workers map the status arrays from shared memory rather
+        # than each getting a pickled copy
+        shared_state, shared_blocks = self.data_service.share_status_cache()
+        try:
+            with ProcessPoolExecutor(
+                max_workers=self.n_workers,
+                initializer=_init_shared_worker,
+                initargs=(shared_state, self.use_minimal_logging)
+            ) as executor:
+                yield from executor.map(_calculate_store_metrics, store_ids, chunksize=chunk_size)
+        finally:
+            for block in shared_blocks:
+                block.close()
+                block.unlink()
+    
+    def _calculate_metrics(self, store_id, week_status, current_time, last_hour_start, last_day_start, last_week_start):
+        """Calculate uptime/downtime metrics for a specific store"""
+        # week_status holds the store's (timestamps, statuses) arrays for the past week, or None.
+        # The time ranges come from _get_report_times, computed once per report
+        logging.debug("Calculating metrics for store: %s", store_id)
         
         # Get store timezone
         timezone_str = self.data_service.get_store_timezone(store_id)
-        timezone = pytz.timezone(timezone_str)
-        logging.debug(f"Store {store_id} timezone: {timezone_str}")
+        logging.debug("Store %s timezone: %s", store_id, timezone_str)
         
         # Get business hours for the store
         business_hours = self.data_service.get_business_hours(store_id)
@@ -152,41 +256,26 @@ class ReportService:
         has_custom_hours = True
         has_reasonable_hours = True
         if not business_hours:
-            logging.debug(f"WARNING: No business hours found for store {store_id}, using 24/7")
+            logging.debug("WARNING: No business hours found for store %s, using 24/7", store_id)
             business_hours = self._generate_24_7_hours(store_id)
             has_custom_hours = False
         else:
-            logging.debug(f"Found {len(business_hours)} business hour records for store {store_id}")
-            # Check if business hours are reasonable (at least 10 minutes per day)
-            total_weekly_minutes = 0
-            for hours in business_hours:
-                if isinstance(hours, dict):
-                    start_time = hours['start_time_local']
-                    end_time = hours['end_time_local']
-                else:
-                    start_time = hours.start_time_local
-                    end_time = hours.end_time_local
-                
-                # Calculate minutes between start and end time
-                start_parts = list(map(int, start_time.split(':')))
-                end_parts = list(map(int, end_time.split(':')))
-                start_minutes = start_parts[0] * 60 + start_parts[1]
-                end_minutes = end_parts[0] * 60 + end_parts[1]
-                
-                # Handle case where end time is on the next day
-                if end_minutes < start_minutes:
-                    end_minutes += 24 * 60
-                    
-                duration = end_minutes - start_minutes
-                total_weekly_minutes += duration
-                
-                # Log for debugging
-                if duration < 10:
-                    logging.debug(f"Unreasonably short hours for store {store_id}, day {hours.day_of_week if hasattr(hours, 'day_of_week') else hours['day_of_week']}: {start_time}-{end_time} ({duration} minutes)")
+            logging.debug("Found %s business hour records for store %s", len(business_hours), store_id)
+            # Check if business hours are reasonable (at least 10 minutes per day).
+            # Each window's duration in whole minutes, wrapping past midnight when
+            # the end time is on the next day
+            durations = [(hours.end_s // 60 - hours.start_s // 60) % (24 * 60) for hours in business_hours]
+            total_weekly_minutes = sum(durations)
+            
+            # Log for debugging
+            if logging.getLogger().isEnabledFor(logging.DEBUG):
+                for hours, duration in zip(business_hours, durations):
+                    if duration < 10:
+                        logging.debug("Unreasonably short hours for store %s, day %s: %s-%s (%s minutes)", store_id, hours.day_of_week, hours.start_time_local, hours.end_time_local, duration)
             
             # If store is open less than 10 hours per week in total, consider the hours data suspect
             if total_weekly_minutes < 600:  # 10 hours = 600 minutes
-                logging.debug(f"WARNING: Store {store_id} has only {total_weekly_minutes} minutes of business time per week, which seems unusually low. Using standard business hours instead.")
+                logging.debug("WARNING: Store %s has only %s minutes of business time per week, which seems unusually low. Using standard business hours instead.", store_id, total_weekly_minutes)
                 # Use standard business hours (9 AM to 9 PM every day) as a fallback
                 business_hours = self._generate_standard_business_hours(store_id)
                 has_reasonable_hours = False
@@ -194,60 +283,50 @@ class ReportService:
                 # Log a sample of business hours for debugging
                 if len(business_hours) > 0:
                     sample = business_hours[0]
-                    if isinstance(sample, dict):
-                        logging.debug(f"Sample hours for day {sample['day_of_week']}: {sample['start_time_local']} to {sample['end_time_local']}")
-                    else:
-                        logging.debug(f"Sample hours for day {sample.day_of_week}: {sample.start_time_local} to {sample.end_time_local}")
+                    logging.debug("Sample hours for day %s: %s to %s", sample.day_of_week, sample.start_time_local, sample.end_time_local)
+        
+        # Map business hours onto UTC intervals once, covering every time the report can sample
+        first_timestamp = self.data_service.get_first_timestamp() or last_week_start
+        intervals_start = min(first_timestamp, last_week_start)
+        business_intervals = self._get_business_intervals(business_hours, timezone_str, intervals_start, current_time)
         
         # Check for any status data in the past week to confirm store exists and has data
-        any_status_data = self.data_service.get_store_status_data(store_id, last_week_start, current_time)
-        if not any_status_data:
-            logging.debug(f"WARNING: No status data found for store {store_id} in the past week")
+        if week_status is None or len(week_status[0]) == 0:
+            logging.debug("WARNING: No status data found for store %s in the past week", store_id)
             
             # Check if there's any historical data at all
             historical_data = self.data_service.get_latest_status_before_range(store_id, last_week_start)
             if not historical_data:
-                logging.debug(f"No historical data found for store {store_id}, this may be a new or inactive store")
+                logging.debug("No historical data found for store %s, this may be a new or inactive store", store_id)
         else:
-            logging.debug(f"Found {len(any_status_data)} status records for store {store_id} in the past week")
+            logging.debug("Found %s status records for store %s in the past week", len(week_status[0]), store_id)
         
         # Calculate metrics for each time range
-        logging.debug(f"Calculating last hour metrics for store {store_id}")
+        logging.debug("Calculating last hour metrics for store %s", store_id)
         last_hour_metrics = self._calculate_time_range_metrics(
-            store_id, last_hour_start, current_time, business_hours, timezone, 'hour'
+            store_id, last_hour_start, current_time, business_intervals, 'hour', week_status
         )
         
-        logging.debug(f"Calculating last day metrics for store {store_id}")
+        logging.debug("Calculating last day metrics for store %s", store_id)
         last_day_metrics = self._calculate_time_range_metrics(
-            store_id, last_day_start, current_time, business_hours, timezone, 'day'
+            store_id, last_day_start, current_time, business_intervals, 'day', week_status
         )
         
-        logging.debug(f"Calculating last week metrics for store {store_id}")
+        logging.debug("Calculating last week metrics for store %s", store_id)
         last_week_metrics = self._calculate_time_range_metrics(
-            store_id, last_week_start, current_time, business_hours, timezone, 'week'
+            store_id, last_week_start, current_time, business_intervals, 'week', week_status
         )
         
         # Log the results for debugging
-        logging.debug(f"Metrics for store {store_id}:")
-        logging.debug(f"  Last hour: uptime={last_hour_metrics['uptime']}min, downtime={last_hour_metrics['downtime']}min")
-        logging.debug(f"  Last day: uptime={last_day_metrics['uptime']}h, downtime={last_day_metrics['downtime']}h")
-        logging.debug(f"  Last week: uptime={last_week_metrics['uptime']}h, downtime={last_week_metrics['downtime']}h")
-        
-        # Calculate total business time for each period to ensure correct uptime/downtime values
-        total_hour_business_time = self._calculate_business_minutes_in_range(
-            store_id, last_hour_start, current_time, business_hours, timezone
-        )
-        total_hour_business_time = min(total_hour_business_time, 60)
+        logging.debug("Metrics for store %s:", store_id)
+        logging.debug("  Last hour: uptime=%smin, downtime=%smin", last_hour_metrics['uptime'], last_hour_metrics['downtime'])
+        logging.debug("  Last day: uptime=%sh, downtime=%sh", last_day_metrics['uptime'], last_day_metrics['downtime'])
+        logging.debug("  Last week: uptime=%sh, downtime=%sh", last_week_metrics['uptime'], last_week_metrics['downtime'])
         
-        total_day_business_time = self._calculate_business_hours_in_range(
-            store_id, last_day_start, current_time, business_hours, timezone
-        )
-        total_day_business_time = min(total_day_business_time, 24)
-        
-        total_week_business_time = self._calculate_business_hours_in_range(
-            store_id, last_week_start, current_time, business_hours, timezone
-        )
-        total_week_business_time = min(total_week_business_time, 168)
+        # Total business time for each period, as computed for the metrics above
+        total_hour_business_time = last_hour_metrics['total_business_time']
+        total_day_business_time = last_day_metrics['total_business_time']
+        total_week_business_time = last_week_metrics['total_business_time']
         
         # Ensure uptime values are non-negative and don't exceed total business time
         hour_uptime = max(0, min(last_hour_metrics['uptime'], total_hour_business_time))
@@ -270,308 +349,196 @@ class ReportService:
             'downtime_last_week(in hours)': round(week_downtime, 2)
         }
         
-        logging.debug(f"Metrics calculation completed for store {store_id}")
+        logging.debug("Metrics calculation completed for store %s", store_id)
         return metrics
     
     def _generate_24_7_hours(self, store_id):
         """Generate 24/7 business hours for a store"""
-        all_days = []
-        for day in range(7):
-            all_days.append({
-                'store_id': store_id,
-                'day_of_week': day,
-                'start_time_local': '00:00:00',
-                'end_time_local': '23:59:59'
-            })
-        return all_days
+        return list(self.HOURS_24_7)
     
     def _generate_standard_business_hours(self, store_id):
         """Generate standard business hours (9 AM to 9 PM) for a store"""
-        all_days = []
-        for day in range(7):
-            all_days.append({
-                'store_id': store_id,
-                'day_of_week': day,
-                'start_time_local': '09:00:00',
-                'end_time_local': '21:00:00'
-            })
-        return all_days
+        return list(self.STANDARD_HOURS)
     
-    def _calculate_time_range_metrics(self, store_id, start_time, end_time, business_hours, timezone, time_range_type):
-        """Calculate uptime/downtime for a specific time range"""
+    def _calculate_time_range_metrics(self, store_id, start_time, end_time, business_intervals, time_range_type, week_status=None):
+        """Calculate uptime/downtime and the total business time for a specific time range"""
         # First, calculate the total business time in the range
-        total_business_time = 0
         if time_range_type == 'hour':
-            total_business_time = self._calculate_business_minutes_in_range(store_id, start_time, end_time, business_hours, timezone)
-            # Sanity check: total business minutes for an hour can't exceed 60
-            total_business_time = min(total_business_time, 60)
+            total_business_time = self._calculate_business_minutes_in_range(store_id, start_time, end_time, business_intervals)
         else:
-            total_business_time = self._calculate_business_hours_in_range(store_id, start_time, end_time, business_hours, timezone)
-            # Sanity check: total business hours for a day can't exceed 24 hours, and for a week can't exceed 168 hours
-            max_hours = 24 if time_range_type == 'day' else 168
-            total_business_time = min(total_business_time, max_hours)
+            total_business_time = self._calculate_business_hours_in_range(store_id, start_time, end_time, business_intervals)
+        # Sanity check: total business time can't exceed what the range can hold
+        total_business_time = min(total_business_time, _RANGE_UNITS[time_range_type][1])
         
-        logging.debug(f"Total business time for store {store_id} in {time_range_type} range: {total_business_time}")
+        logging.debug("Total business time for store %s in %s range: %s", store_id, time_range_type, total_business_time)
         
         # If no business time in this period, return zeros for both uptime and downtime
         if total_business_time <= 0:
-            logging.debug(f"No business time for store {store_id} in {time_range_type} range")
-            return {'uptime': 0, 'downtime': 0}
+            logging.debug("No business time for store %s in %s range", store_id, time_range_type)
+            return {'uptime': 0, 'downtime': 0, 'total_business_time': total_business_time}
         
         # Get status data for the store in the given time range
-        status_data = self.data_service.get_store_status_data(store_id, start_time, end_time)
+        status_timestamps, status_codes = self._get_range_status_arrays(store_id, start_time, end_time, week_status)
         
         # If no data within range, try to use the last known status before this range
         # This is important for continuous monitoring
-        if not status_data:
-            logging.debug(f"No status data found for store {store_id} in {time_range_type} range. Looking for historical data.")
+        if len(status_timestamps) == 0:
+            logging.debug("No status data found for store %s in %s range. Looking for historical data.", store_id, time_range_type)
             
             # Check for data in the past week to be more thorough
             extended_start = start_time - timedelta(days=7)
             extended_status_data = self.data_service.get_store_status_data(store_id, extended_start, start_time)
             
             if extended_status_data:
-                logging.debug(f"Found {len(extended_status_data)} historical status entries in the past week for store {store_id}")
+                logging.debug("Found %s historical status entries in the past week for store %s", len(extended_status_data), store_id)
                 latest_status = extended_status_data[-1].status
                 
-                if latest_status == 'active':
-                    logging.debug(f"Latest historical status was active, assuming uptime for store {store_id}")
-                    return {'uptime': total_business_time, 'downtime': 0}
+                if latest_status == 1:
+                    logging.debug("Latest historical status was active, assuming uptime for store %s", store_id)
+                    return {'uptime': total_business_time, 'downtime': 0, 'total_business_time': total_business_time}
                 else:
-                    logging.debug(f"Latest historical status was inactive, assuming downtime for store {store_id}")
-                    return {'uptime': 0, 'downtime': total_business_time}
+                    logging.debug("Latest historical status was inactive, assuming downtime for store %s", store_id)
+                    return {'uptime': 0, 'downtime': total_business_time, 'total_business_time': total_business_time}
             
             # If no data in past week, look for any historical data
             last_known = self.data_service.get_latest_status_before_range(store_id, start_time)
             
             if last_known:
-                logging.debug(f"Found historical status: {last_known.status} at {last_known.timestamp_utc}")
+                logging.debug("Found historical status: %s at %s", last_known.status, last_known.timestamp_utc)
                 # If last known status was active, we'll assume uptime
-                if last_known.status == 'active':
-                    logging.debug(f"Last known status was active, assuming uptime for store {store_id}")
-                    return {'uptime': total_business_time, 'downtime': 0}
+                if last_known.status == 1:
+                    logging.debug("Last known status was active, assuming uptime for store %s", store_id)
+                    return {'uptime': total_business_time, 'downtime': 0, 'total_business_time': total_business_time}
                 else:
-                    logging.debug(f"Last known status was inactive, assuming downtime for store {store_id}")
-                    return {'uptime': 0, 'downtime': total_business_time}
+                    logging.debug("Last known status was inactive, assuming downtime for store %s", store_id)
+                    return {'uptime': 0, 'downtime': total_business_time, 'total_business_time': total_business_time}
             else:
                 # If no historical data at all, we should be more conservative
                 # Look for any status data for this store in the database, even future data
-                any_status = self.data_service.session.query(StoreStatus).filter_by(store_id=store_id).first()
+                any_status = self.data_service.has_status_data(store_id)
                 
                 if any_status:
-                    logging.debug(f"Found some status data for store {store_id}, using default assumption of active")
+                    logging.debug("Found some status data for store %s, using default assumption of active", store_id)
                     # If the store exists in the database, default to assuming it's normally active
                     # This is a more reasonable assumption as most stores are supposed to be active during business hours
-                    return {'uptime': total_business_time, 'downtime': 0}
+                    return {'uptime': total_business_time, 'downtime': 0, 'total_business_time': total_business_time}
                 else:
                     # If no data at all, it's safer to assume the store is down
-                    logging.debug(f"No historical data found for store {store_id}, assuming downtime")
-                    return {'uptime': 0, 'downtime': total_business_time}
+                    logging.debug("No historical data found for store %s, assuming downtime", store_id)
+                    return {'uptime': 0, 'downtime': total_business_time, 'total_business_time': total_business_time}
         
         # Calculate uptime and downtime based on the status data
-        logging.debug(f"Interpolating status data for store {store_id} in {time_range_type} range with {len(status_data)} records")
-        uptime, downtime = self._interpolate_status(store_id, status_data, start_time, end_time, business_hours, timezone, time_range_type)
-        logging.debug(f"Interpolation results for store {store_id} in {time_range_type} range: uptime={uptime}, downtime={downtime}")
-        
-        # Ensure uptime and downtime are non-negative
-        uptime = max(0, uptime)
-        downtime = max(0, downtime)
-        
-        # Make sure they don't exceed total business time
-        if uptime > total_business_time:
-            uptime = total_business_time
-            downtime = 0
-        elif downtime > total_business_time:
-            downtime = total_business_time
-            uptime = 0
-        # Make sure they sum to total business time (handle rounding errors)
-        elif abs((uptime + downtime) - total_business_time) > 0.1:
-            logging.debug(f"Warning: Uptime ({uptime}) + Downtime ({downtime}) != Total business time ({total_business_time})")
-            # Adjust downtime to make them sum correctly
-            downtime = total_business_time - uptime
-        
-        # Final sanity check to make sure we don't have negative values
-        uptime = max(0, min(uptime, total_business_time))
-        downtime = max(0, min(downtime, total_business_time))
+        logging.debug("Interpolating status data for store %s in %s range with %s records", store_id, time_range_type, len(status_timestamps))
+        uptime, downtime = self._interpolate_status(
+            store_id, status_timestamps, status_codes, start_time, end_time, business_intervals, time_range_type, total_business_time
+        )
+        logging.debug("Interpolation results for store %s in %s range: uptime=%s, downtime=%s", store_id, time_range_type, uptime, downtime)
         
-        # Double-check that sum equals total business time
-        if abs((uptime + downtime) - total_business_time) > 0.1:
-            # Force adjustment to ensure they sum to total
-            ratio = total_business_time / (uptime + downtime) if uptime + downtime > 0 else 0
-            uptime = uptime * ratio
-            downtime = total_business_time - uptime
+        # Keep uptime within the total business time; the rest of it is downtime
+        uptime = max(0, min(uptime, total_business_time))
+        downtime = total_business_time - uptime
         
-        return {'uptime': uptime, 'downtime': downtime}
+        return {'uptime': uptime, 'downtime': downtime, 'total_business_time': total_business_time}
     
-    def _interpolate_status(self, store_id, status_data, start_time, end_time, business_hours, timezone, time_range_type):
-        """Interpolate status data to calculate uptime/downtime"""
-        # Convert status data to DataFrame for easier manipulation
-        logging.debug(f"Converting status data to DataFrame for store {store_id}")
-        df = pd.DataFrame([(s.timestamp_utc, s.status) for s in status_data], columns=['timestamp_utc', 'status'])
+    def _get_range_status_arrays(self, store_id, start_time, end_time, week_status):
+        """Get (timestamps, status codes) arrays for a range within the report's past week, sliced from the store's week of data when possible"""
+        # With at least 3 records in the range the data service returns exactly those
+        # records, so they can be sliced from the week's arrays without another lookup
+        if week_status is not None:
+            timestamps, statuses = week_status
+            lo = timestamps.searchsorted(np.datetime64(start_time))
+            if len(timestamps) - lo >= 3 and timestamps[-1] <= np.datetime64(end_time):
+                return timestamps[lo:], statuses[lo:]
+        
+        # Otherwise let the data service widen the search around the range
+        return self.data_service.get_store_status_arrays(store_id, start_time, end_time)
+    
+    def _interpolate_status(self, store_id, status_timestamps, status_codes, start_time, end_time, business_intervals, time_range_type, total_business_time):
+        """Interpolate status data to calculate uptime/downtime, given the (capped) total business time in the range"""
+        # status_timestamps and status_codes are parallel, time-ordered arrays (1 = active, 0 = inactive)
+        record_count = len(status_timestamps)
         
         # If no data points, we need to be more careful about assuming downtime
-        if df.empty:
-            logging.debug(f"Empty DataFrame for store {store_id} after conversion")
+        if record_count == 0:
+            logging.debug("No status data for store %s to interpolate", store_id)
             
             # Check if we have any historical data at all for this store
             historical_data = self.data_service.get_latest_status_before_range(store_id, start_time)
             
             # If we have historical data and it's active, consider the store as active
             # Otherwise, default to treating as inactive during business hours
-            if historical_data and historical_data.status == 'active':
-                logging.debug(f"Found historical active status for store {store_id}, treating as active")
-                # Get the total business time in this period - we'll return all uptime
-                if time_range_type == 'hour':
-                    business_minutes = self._calculate_business_minutes_in_range(store_id, start_time, end_time, business_hours, timezone)
-                    # Cap at 60 minutes for an hour
-                    business_minutes = min(business_minutes, 60)
-                    return business_minutes, 0  # All uptime
-                else:
-                    # Calculate total business hours and cap at reasonable limits
-                    business_hours_in_range = self._calculate_business_hours_in_range(store_id, start_time, end_time, business_hours, timezone)
-                    max_hours = 24 if time_range_type == 'day' else 168
-                    business_hours_in_range = min(business_hours_in_range, max_hours)
-                    return business_hours_in_range, 0  # All uptime
+            if historical_data and historical_data.status == 1:
+                logging.debug("Found historical active status for store %s, treating as active", store_id)
+                return total_business_time, 0  # All uptime
             else:
                 # Instead of defaulting to inactive, check for any status data for this store
-                any_status = self.data_service.session.query(StoreStatus).filter_by(store_id=store_id).first()
+                any_status = self.data_service.has_status_data(store_id)
                 
                 if any_status:
-                    logging.debug(f"Found some status data for store {store_id}, assuming active during business hours by default")
-                    # Get the total business time in this period - we'll return all uptime
-                    if time_range_type == 'hour':
-                        business_minutes = self._calculate_business_minutes_in_range(store_id, start_time, end_time, business_hours, timezone)
-                        # Cap at 60 minutes for an hour
-                        business_minutes = min(business_minutes, 60)
-                        return business_minutes, 0  # Default to uptime
-                    else:
-                        # Calculate total business hours and cap at reasonable limits
-                        business_hours_in_range = self._calculate_business_hours_in_range(store_id, start_time, end_time, business_hours, timezone)
-                        max_hours = 24 if time_range_type == 'day' else 168 
-                        business_hours_in_range = min(business_hours_in_range, max_hours)
-                        return business_hours_in_range, 0  # Default to uptime
+                    logging.debug("Found some status data for store %s, assuming active during business hours by default", store_id)
+                    return total_business_time, 0  # Default to uptime
                 else:
-                    logging.debug(f"No historical data or inactive status for store {store_id}, treating as inactive")
-                    # Get the total business time in this period - we'll return all downtime
-                    if time_range_type == 'hour':
-                        business_minutes = self._calculate_business_minutes_in_range(store_id, start_time, end_time, business_hours, timezone)
-                        # Cap at 60 minutes for an hour
-                        business_minutes = min(business_minutes, 60)
-                        return 0, business_minutes  # All downtime
-                    else:
-                        # Calculate total business hours and cap at reasonable limits
-                        business_hours_in_range = self._calculate_business_hours_in_range(store_id, start_time, end_time, business_hours, timezone)
-                        max_hours = 24 if time_range_type == 'day' else 168 
-                        business_hours_in_range = min(business_hours_in_range, max_hours)
-                        return 0, business_hours_in_range  # All downtime
+                    logging.debug("No historical data or inactive status for store %s, treating as inactive", store_id)
+                    return 0, total_business_time  # All downtime
+        
+        # Timestamps and statuses with a spare slot at each end for the range boundaries.
+        # The records are already time-ordered, so they need no sorting
+        timestamps = np.empty(record_count + 2, dtype='datetime64[ns]')
+        statuses = np.empty(record_count + 2, dtype=bool)  # True = active
+        timestamps[1:-1] = status_timestamps
+        statuses[1:-1] = status_codes
+        first = 1
+        last = record_count + 1
         
         # Add start and end times if they are not in the data
-        if df['timestamp_utc'].min() > start_time:
-            logging.debug(f"Adding start time to DataFrame for store {store_id}")
+        if timestamps[1] > np.datetime64(start_time):
+            logging.debug("Adding start time for store %s", store_id)
             # Use the status of the first data point for the start time
-            first_status = df.iloc[0]['status']
-            df = pd.concat([pd.DataFrame([{'timestamp_utc': start_time, 'status': first_status}]), df])
+            first = 0
+            timestamps[0] = start_time
+            statuses[0] = statuses[1]
         
-        if df['timestamp_utc'].max() < end_time:
-            logging.debug(f"Adding end time to DataFrame for store {store_id}")
+        if timestamps[-2] < np.datetime64(end_time):
+            logging.debug("Adding end time for store %s", store_id)
             # Use the status of the last data point for the end time
-            last_status = df.iloc[-1]['status']
-            df = pd.concat([df, pd.DataFrame([{'timestamp_utc': end_time, 'status': last_status}])])
+            last = record_count + 2
+            timestamps[-1] = end_time
+            statuses[-1] = statuses[-2]
         
-        # Sort by timestamp
-        df = df.sort_values('timestamp_utc')
+        timestamps = timestamps[first:last]
+        statuses = statuses[first:last]
         
-        logging.debug(f"Calculating intervals between observations for store {store_id}")
-        # Calculate time intervals between consecutive observations
-        df['next_timestamp'] = df['timestamp_utc'].shift(-1)
-        df['interval'] = (df['next_timestamp'] - df['timestamp_utc']).dt.total_seconds()
-        
-        # Filter out the last row (which has NaN for next_timestamp)
-        df = df[:-1]
-        
-        # Initialize uptime and downtime counters based on time_range_type
-        uptime = 0
-        downtime = 0
+        logging.debug("Calculating intervals between observations for store %s", store_id)
+        # Each interval runs from one observation to the next, with that observation's status
+        seconds = timestamps.astype(np.int64) / 1e9
+        interval_starts = seconds[:-1]
+        interval_ends = seconds[1:]
+        interval_active = statuses[:-1]
         
         # If we have long gaps between observations (more than 3 hours),
         # we should handle them specially - stores are likely active during business hours
         max_reasonable_gap = 3 * 60 * 60  # 3 hours in seconds
         
-        # Calculate total business time for the entire range
-        if time_range_type == 'hour':
-            total_business_time = self._calculate_business_minutes_in_range(store_id, start_time, end_time, business_hours, timezone)
-            # Cap at 60 minutes for an hour
-            total_business_time = min(total_business_time, 60)
-        else:
-            # Calculate total business hours and cap at reasonable limits
-            total_business_time = self._calculate_business_hours_in_range(store_id, start_time, end_time, business_hours, timezone)
-            max_hours = 24 if time_range_type == 'day' else 168
-            total_business_time = min(total_business_time, max_hours)
-        
-        logging.debug(f"Processing {len(df)} intervals for store {store_id}")
-        # Process each interval
-        for idx, row in df.iterrows():
-            start_interval = row['timestamp_utc']
-            end_interval = row['next_timestamp']
-            status = row['status']
-            interval_length = row['interval']
-            
-            # Special handling for long gaps in data
-            if interval_length > max_reasonable_gap:
-                logging.debug(f"Long gap detected for store {store_id}: {interval_length/3600:.2f} hours")
-                
-                # For long gaps, we handle business hours and non-business hours differently
-                # For non-business hours, we use the normal interval calculation
-                
-                # Convert interval start/end to local time to check business hours
-                local_start = get_local_time(start_interval, timezone)
-                local_end = get_local_time(end_interval, timezone)
-                
-                # Check if start and end are in business hours
-                start_in_business = self._is_business_time(local_start, business_hours)
-                end_in_business = self._is_business_time(local_end, business_hours)
-                
-                # If both are in business hours, adjust calculation to favor uptime during business hours
-                if start_in_business and end_in_business:
-                    logging.debug(f"Long gap during business hours, adjusting calculation to favor uptime")
-                    
-                    # Assume active during business hours unless proven otherwise
-                    if status == 'active':
-                        interval_uptime, interval_downtime = self._calculate_interval_metrics(
-                            store_id, start_interval, end_interval, 'active', business_hours, timezone, time_range_type
-                        )
-                    else:
-                        # If current status is inactive, split the interval:
-                        # - First hour maintains the inactive status
-                        # - Rest of the time during business hours assumed to be active
-                        first_part_end = start_interval + timedelta(hours=1)
-                        second_part_start = first_part_end
-                        
-                        # Calculate for first part (inactive)
-                        first_uptime, first_downtime = self._calculate_interval_metrics(
-                            store_id, start_interval, first_part_end, 'inactive', business_hours, timezone, time_range_type
-                        )
-                        
-                        # Calculate for second part (assume active during business hours)
-                        second_uptime, second_downtime = self._calculate_interval_metrics(
-                            store_id, second_part_start, end_interval, 'active', business_hours, timezone, time_range_type
-                        )
-                        
-                        interval_uptime = first_uptime + second_uptime
-                        interval_downtime = first_downtime + second_downtime
-                else:
-                    # Regular calculation for non-business hours
-                    interval_uptime, interval_downtime = self._calculate_interval_metrics(
-                        store_id, start_interval, end_interval, status, business_hours, timezone, time_range_type
-                    )
-            else:
-                # For normal intervals, just use the standard calculation
-                interval_uptime, interval_downtime = self._calculate_interval_metrics(
-                    store_id, start_interval, end_interval, status, business_hours, timezone, time_range_type
-                )
-            
-            uptime += interval_uptime
-            downtime += interval_downtime
+        logging.debug("Processing %s intervals for store %s", len(interval_starts), store_id)
+        # Long gaps that start and end in business hours are assumed to be active during
+        # business hours unless proven otherwise. If the status at the start was inactive,
+        # the interval is split: the first hour keeps the inactive status and the rest
+        # is counted as active. Other intervals keep their observed status.
+        long_gap = (
+            (interval_ends - interval_starts > max_reasonable_gap)
+            & self._in_business_intervals(interval_starts, business_intervals)
+            & self._in_business_intervals(interval_ends, business_intervals)
+        )
+        split = long_gap & ~interval_active
+        piece_starts = np.concatenate((interval_starts, interval_starts[split] + 3600))
+        piece_ends = np.concatenate((np.where(split, interval_starts + 3600, interval_ends), interval_ends[split]))
+        piece_active = np.concatenate((interval_active, np.ones(np.count_nonzero(split), dtype=bool)))
+        
+        business_time = self._calculate_business_time_in_intervals(
+            piece_starts, piece_ends, business_intervals, time_range_type
+        )
+        uptime = float(business_time[piece_active].sum())
+        downtime = float(business_time[~piece_active].sum())
         
         # Ensure uptime and downtime don't exceed total business time
         uptime = min(uptime, total_business_time)
@@ -583,203 +550,92 @@ class ReportService:
             uptime *= ratio
             downtime *= ratio
             
-        logging.debug(f"Total uptime/downtime for store {store_id}: uptime={uptime}, downtime={downtime}")
+        logging.debug("Total uptime/downtime for store %s: uptime=%s, downtime=%s", store_id, uptime, downtime)
         return uptime, downtime
     
-    def _calculate_interval_metrics(self, store_id, start_interval, end_interval, status, business_hours, timezone, time_range_type):
-        """Calculate uptime/downtime for a specific interval"""
-        # Safety check - ensure that end_interval is after start_interval
-        if end_interval <= start_interval:
-            logging.debug(f"Invalid interval for store {store_id}: end {end_interval} <= start {start_interval}")
-            return 0, 0
-            
-        # Convert interval to local time
-        local_start = get_local_time(start_interval, timezone)
-        local_end = get_local_time(end_interval, timezone)
-        
-        # Calculate total business time in this interval
-        business_time = self._calculate_business_time_in_interval(store_id, local_start, local_end, business_hours, time_range_type)
-        
-        # Apply reasonable caps on the business time based on the interval length
-        interval_length_seconds = (end_interval - start_interval).total_seconds()
-        
-        if time_range_type == 'hour':
-            # Convert seconds to minutes for hourly calculation
-            max_business_time = min(interval_length_seconds / 60, 60)
-            business_time = min(business_time, max_business_time)
-        else:
-            # Convert seconds to hours for daily/weekly calculation
-            max_business_time = interval_length_seconds / 3600
-            
-            # Add additional caps based on time range type
-            if time_range_type == 'day':
-                max_business_time = min(max_business_time, 24)
-            elif time_range_type == 'week':
-                max_business_time = min(max_business_time, 168)
-                
-            business_time = min(business_time, max_business_time)
-        
-        # If status is active, add to uptime, otherwise to downtime
-        if status == 'active':
-            return business_time, 0
-        else:
-            return 0, business_time
-    
-    def _calculate_business_time_in_interval(self, store_id, local_start, local_end, business_hours, time_range_type):
-        """Calculate business time in a given interval"""
-        # Initialize counters
-        business_time = 0
-        
-        # Safety check - ensure that local_end is after local_start
-        if local_end <= local_start:
-            logging.debug(f"Invalid local time interval for store {store_id}: end {local_end} <= start {local_start}")
-            return 0
-            
-        # Calculate maximum possible time in this interval
-        max_possible_time = (local_end - local_start).total_seconds()
-        if time_range_type == 'hour':
-            # Convert to minutes for hourly calculation
-            max_possible_time /= 60
-            # Cap at 60 minutes for hour calculations
-            max_possible_time = min(max_possible_time, 60)
-        else:
-            # Convert to hours for daily/weekly calculation
-            max_possible_time /= 3600
-            # Apply caps based on time range type
-            if time_range_type == 'day':
-                max_possible_time = min(max_possible_time, 24)
-            elif time_range_type == 'week':
-                max_possible_time = min(max_possible_time, 168)
-        
-        # Current time pointer
-        current = local_start
-        
-        # Iterate through the interval in 15-minute increments
-        increment = timedelta(minutes=15)
-        
-        # Prevent excessive iterations for long intervals
-        max_iterations = 1000  # This is a safety limit to prevent infinite loops
-        iteration_count = 0
-        
-        while current < local_end and iteration_count < max_iterations:
-            next_time = min(current + increment, local_end)
-            
-            # Check if midpoint of this 15-min segment is within business hours
-            midpoint = current + (next_time - current) / 2
-            is_business = self._is_business_time(midpoint, business_hours)
-            
-            if is_business:
-                # Calculate the duration in appropriate units
-                duration_seconds = (next_time - current).total_seconds()
-                
-                if time_range_type == 'hour':
-                    # Convert to minutes
-                    business_time += duration_seconds / 60
-                else:
-                    # Convert to hours
-                    business_time += duration_seconds / 3600
-            
-            # Move to next 15-min segment
-            current = next_time
-            iteration_count += 1
-        
-        # Ensure the business time doesn't exceed the maximum possible time
-        business_time = min(business_time, max_possible_time)
-        
-        return business_time
+    def _calculate_business_time_in_intervals(self, interval_starts, interval_ends, business_intervals, time_range_type):
+        """Calculate business time in each interval, given as arrays of UTC epoch seconds"""
+        # Empty or inverted intervals have no business time
+        interval_seconds = np.maximum(interval_ends - interval_starts, 0)
+        
+        # Split every interval into 15-minute segments (at most 1000 per interval) and
+        # count a segment as business time if its midpoint is within business hours
+        increment = 15 * 60
+        segment_counts = np.minimum(np.ceil(interval_seconds / increment), 1000).astype(np.int64)
+        segment_interval = np.repeat(np.arange(len(interval_starts)), segment_counts)
+        first_segment = np.repeat(np.cumsum(segment_counts) - segment_counts, segment_counts)
+        segment_starts = (np.arange(len(segment_interval)) - first_segment) * increment
+        segment_ends = np.minimum(segment_starts + increment, interval_seconds[segment_interval])
+        midpoints = interval_starts[segment_interval] + (segment_starts + segment_ends) / 2
+        is_business = self._in_business_intervals(midpoints, business_intervals)
+        
+        # Sum the business seconds, then convert to minutes for hourly calculation, hours otherwise
+        unit_seconds, max_range_time = _RANGE_UNITS[time_range_type]
+        business_time = np.bincount(
+            segment_interval[is_business],
+            weights=(segment_ends - segment_starts)[is_business],
+            minlength=len(interval_starts)
+        ) / unit_seconds
+        
+        # Business time can't exceed the interval itself, and is capped at
+        # 60 minutes for an hour, 24 hours for a day and 168 hours for a week
+        max_possible_time = np.minimum(interval_seconds / unit_seconds, max_range_time)
+        return np.minimum(business_time, max_possible_time)
     
-    def _is_business_time(self, local_time, business_hours):
+    def _is_business_time(self, local_time, business_hours, hours_by_day=None, most_common_hours=None):
         """Check if a given local time is within business hours"""
         # Get day of week (0=Monday, 6=Sunday)
         day_of_week = local_time.weekday()
         
-        # Convert time to string format for comparison
-        time_str = local_time.strftime('%H:%M:%S')
+        # Only this day's business hours can match. Callers checking many times can
+        # group the hours by day once and pass them in as hours_by_day, along with
+        # the most_common_hours fallback
+        if hours_by_day is None:
+            hours_by_day = self._group_hours_by_day(business_hours)
+        day_hours = hours_by_day.get(day_of_week, [])
+        
+        # Whole minutes and seconds of the day, for comparing with the business hour bounds
+        current_minutes = local_time.hour * 60 + local_time.minute
+        current_seconds = current_minutes * 60 + local_time.second
         
         # Flag to check if we found valid business hours for this day
-        valid_hours_for_day = False
+        valid_hours_for_day = bool(day_hours)
         unreasonable_hours = False
         unusual_hours = False
         
         # Check if time is within any business hour for this day
-        for hours in business_hours:
-            if isinstance(hours, dict):  # Handle both dict and object formats
-                if hours['day_of_week'] == day_of_week:
-                    valid_hours_for_day = True
-                    start_time = hours['start_time_local']
-                    end_time = hours['end_time_local']
-                    
-                    # Check for unusual hours (like ending at 23:59:59)
-                    if end_time == '23:59:59':
-                        unusual_hours = True
-                    
-                    # Calculate minutes between start and end time
-                    start_parts = list(map(int, start_time.split(':')))
-                    end_parts = list(map(int, end_time.split(':')))
-                    start_minutes = start_parts[0] * 60 + start_parts[1]
-                    end_minutes = end_parts[0] * 60 + end_parts[1]
-                    
-                    # Handle case where end time is on the next day (crossing midnight)
-                    if end_minutes < start_minutes:
-                        # For overnight hours, we need to check both sides of midnight
-                        current_time_parts = list(map(int, time_str.split(':')))
-                        current_minutes = current_time_parts[0] * 60 + current_time_parts[1]
-                        
-                        # Check if current time is between start and midnight
-                        if start_minutes <= current_minutes:
-                            return True
-                        
-                        # Check if current time is between midnight and end
-                        if current_minutes <= end_minutes:
-                            return True
-                    
-                    # Check if business hours are unreasonably short (less than 10 minutes)
-                    if end_minutes - start_minutes < 10:
-                        logging.debug(f"Unreasonably short business hours detected: {start_time} to {end_time} (only {end_minutes - start_minutes} minutes)")
-                        unreasonable_hours = True
-                        # Don't return yet, check if there are other business hours for this day
-                    else:
-                        # Normal case - check if current time is within business hours
-                        # Use a more flexible comparison for edge cases
-                        if start_time <= time_str <= end_time:
-                            return True
-            else:  # Same logic for object format
-                if hours.day_of_week == day_of_week:
-                    valid_hours_for_day = True
-                    start_time = hours.start_time_local
-                    end_time = hours.end_time_local
-                    
-                    # Check for unusual hours (like ending at 23:59:59)
-                    if end_time == '23:59:59':
-                        unusual_hours = True
-                    
-                    # Calculate minutes between start and end time
-                    start_parts = list(map(int, start_time.split(':')))
-                    end_parts = list(map(int, end_time.split(':')))
-                    start_minutes = start_parts[0] * 60 + start_parts[1]
-                    end_minutes = end_parts[0] * 60 + end_parts[1]
-                    
-                    # Handle case where end time is on the next day
-                    if end_minutes < start_minutes:
-                        # For overnight hours, we need to check both sides of midnight
-                        current_time_parts = list(map(int, time_str.split(':')))
-                        current_minutes = current_time_parts[0] * 60 + current_time_parts[1]
-                        
-                        # Check if current time is between start and midnight
-                        if start_minutes <= current_minutes:
-                            return True
-                        
-                        # Check if current time is between midnight and end
-                        if current_minutes <= end_minutes:
-                            return True
-                    
-                    # Check if business hours are unreasonably short
-                    if end_minutes - start_minutes < 10:
-                        logging.debug(f"Unreasonably short business hours detected: {start_time} to {end_time} (only {end_minutes - start_minutes} minutes)")
-                        unreasonable_hours = True
-                    else:
-                        if start_time <= time_str <= end_time:
-                            return True
+        for hours in day_hours:
+            start_time = hours.start_time_local
+            end_time = hours.end_time_local
+            
+            # Check for unusual hours (like ending at 23:59:59)
+            if end_time == '23:59:59':
+                unusual_hours = True
+            
+            # Minutes between start and end time, from the seconds parsed at load time
+            start_minutes = hours.start_s // 60
+            end_minutes = hours.end_s // 60
+            
+            # Handle case where end time is on the next day (crossing midnight)
+            if end_minutes < start_minutes:
+                # For overnight hours, we need to check both sides of midnight
+                # Check if current time is between start and midnight
+                if start_minutes <= current_minutes:
+                    return True
+                
+                # Check if current time is between midnight and end
+                if current_minutes <= end_minutes:
+                    return True
+            
+            # Check if business hours are unreasonably short (less than 10 minutes)
+            if end_minutes - start_minutes < 10:
+                logging.debug("Unreasonably short business hours detected: %s to %s (only %s minutes)", start_time, end_time, end_minutes - start_minutes)
+                unreasonable_hours = True
+                # Don't return yet, check if there are other business hours for this day
+            else:
+                # Normal case - check if current time is within business hours
+                if hours.start_s <= current_seconds <= hours.end_s:
+                    return True
         
         # If we found business hours for this day but they were all unreasonably short,
         # assume this is a data issue and treat as if the store is open for standard hours
@@ -787,7 +643,7 @@ class ReportService:
             # Check if current time is between 9 AM and 9 PM as a reasonable default
             current_hour = local_time.hour
             if 9 <= current_hour < 21:  # 9 AM to 9 PM
-                logging.debug(f"Using default 9-21 hours due to unreasonable business hours")
+                logging.debug("Using default 9-21 hours due to unreasonable business hours")
                 return True
         
         # If hours end at 23:59:59, it might be a day where the store is open 24 hours
@@ -795,152 +651,205 @@ class ReportService:
         if valid_hours_for_day and unusual_hours:
             # If any hours end at 23:59:59, check if there's also a corresponding early morning start
             morning_start = False
-            for hours in business_hours:
-                if isinstance(hours, dict):
-                    if hours['day_of_week'] == day_of_week:
-                        start_time = hours['start_time_local']
-                        start_parts = list(map(int, start_time.split(':')))
-                        if start_parts[0] < 6:  # Starts before 6 AM
-                            morning_start = True
-                            break
-                else:
-                    if hours.day_of_week == day_of_week:
-                        start_time = hours.start_time_local
-                        start_parts = list(map(int, start_time.split(':')))
-                        if start_parts[0] < 6:  # Starts before 6 AM
-                            morning_start = True
-                            break
+            for hours in day_hours:
+                if hours.start_s < 6 * 3600:  # Starts before 6 AM
+                    morning_start = True
+                    break
             
             # If we have both late closing and early opening, it might indicate 24-hour operation
             if morning_start:
-                logging.debug(f"Detected possible 24-hour operation based on unusual hours")
+                logging.debug("Detected possible 24-hour operation based on unusual hours")
                 return True
         
         # If no explicit business hours for today, but the store has business hours for other days,
         # use the most common hours as a fallback
         if not valid_hours_for_day and business_hours:
-            common_hours = {}
-            for hours in business_hours:
-                if isinstance(hours, dict):
-                    key = f"{hours['start_time_local']}-{hours['end_time_local']}"
-                    common_hours[key] = common_hours.get(key, 0) + 1
-                else:
-                    key = f"{hours.start_time_local}-{hours.end_time_local}"
-                    common_hours[key] = common_hours.get(key, 0) + 1
+            if most_common_hours is None:
+                most_common_hours = self._most_common_hours(business_hours)
+            start_time, end_time = most_common_hours.start_time_local, most_common_hours.end_time_local
             
-            if common_hours:
-                # Find most common hours
-                most_common = max(common_hours.items(), key=lambda x: x[1])
-                most_common_key = most_common[0]
-                start_time, end_time = most_common_key.split('-')
-                
-                logging.debug(f"No hours for day {day_of_week}, using most common hours: {start_time}-{end_time}")
-                
-                # Check if current time is within these hours
-                if start_time <= time_str <= end_time:
-                    return True
+            logging.debug("No hours for day %s, using most common hours: %s-%s", day_of_week, start_time, end_time)
+            
+            # Check if current time is within these hours
+            if most_common_hours.start_s <= current_seconds <= most_common_hours.end_s:
+                return True
         
         return False
     
-    def _calculate_business_minutes_in_range(self, store_id, start_time, end_time, business_hours, timezone):
+    def _group_hours_by_day(self, business_hours):
+        """Group business hours by day of week: {day_of_week: [hours, ...]}"""
+        hours_by_day = {}
+        for hours in business_hours:
+            hours_by_day.setdefault(hours.day_of_week, []).append(hours)
+        return hours_by_day
+    
+    def _most_common_hours(self, business_hours):
+        """Get the most common start/end business hours across all days, or None if there are none"""
+        # Ties go to the hours seen first
+        hours_by_times = {}
+        counts = Counter()
+        for hours in business_hours:
+            times = (hours.start_time_local, hours.end_time_local)
+            hours_by_times.setdefault(times, hours)
+            counts[times] += 1
+        return hours_by_times[max(counts, key=counts.get)] if counts else None
+    
+    def _calculate_business_minutes_in_range(self, store_id, start_time, end_time, business_intervals):
         """Calculate total business minutes in a time range"""
-        logging.debug(f"Calculating business minutes in range for store {store_id}")
-        # For hour calculation, we need minutes
-        business_minutes = 0
+        logging.debug("Calculating business minutes in range for store %s", store_id)
         
         # Safety check - ensure that end_time is after start_time
         if end_time <= start_time:
-            logging.debug(f"Invalid time range for store {store_id}: end time {end_time} <= start time {start_time}")
+            logging.debug("Invalid time range for store %s: end time %s <= start time %s", store_id, end_time, start_time)
             return 0
             
         # Calculate the maximum possible minutes in this range
-        max_possible_minutes = int((end_time - start_time).total_seconds() / 60)
-        
-        # Convert to local timezone
-        local_start = get_local_time(start_time, timezone)
-        local_end = get_local_time(end_time, timezone)
+        range_seconds = (end_time - start_time).total_seconds()
+        max_possible_minutes = int(range_seconds / 60)
         
-        # Calculate business minutes
-        current = local_start
-        increment = timedelta(minutes=1)
-        
-        # Prevent infinite loops by setting a reasonable limit
-        iteration_limit = min(max_possible_minutes, 24 * 60)  # At most 24 hours of computation
-        iteration_count = 0
-        
-        while current < local_end and iteration_count < iteration_limit:
-            if self._is_business_time(current, business_hours):
-                business_minutes += 1
-            current += increment
-            iteration_count += 1
+        # Check the start of each minute, for at most 24 hours
+        sample_count = min(max_possible_minutes, 24 * 60)
+        samples = to_epoch_seconds(start_time) + 60 * np.arange(sample_count)
+        business_minutes = int(np.count_nonzero(self._in_business_intervals(samples, business_intervals)))
         
         # The total business minutes for a limited time range can't exceed the time range itself
         business_minutes = min(business_minutes, max_possible_minutes)
         
         # For an hour range, cap at 60 minutes
-        if (end_time - start_time) <= timedelta(hours=1):
+        if range_seconds <= 3600:
             business_minutes = min(business_minutes, 60)
             
-        logging.debug(f"Total business minutes in range for store {store_id}: {business_minutes} (max possible: {max_possible_minutes})")
+        logging.debug("Total business minutes in range for store %s: %s (max possible: %s)", store_id, business_minutes, max_possible_minutes)
         return business_minutes
     
-    def _calculate_business_hours_in_range(self, store_id, start_time, end_time, business_hours, timezone):
+    def _calculate_business_hours_in_range(self, store_id, start_time, end_time, business_intervals):
         """Calculate total business hours in a time range"""
-        logging.debug(f"Calculating business hours in range for store {store_id}")
-        # For day/week calculation, we need hours
-        business_hours_count = 0
+        logging.debug("Calculating business hours in range for store %s", store_id)
         
         # Safety check - ensure that end_time is after start_time
         if end_time <= start_time:
-            logging.debug(f"Invalid time range for store {store_id}: end time {end_time} <= start time {start_time}")
+            logging.debug("Invalid time range for store %s: end time %s <= start time %s", store_id, end_time, start_time)
             return 0
             
         # Calculate the maximum possible hours in this range
-        max_possible_hours = (end_time - start_time).total_seconds() / 3600
-        
-        # Convert to local timezone
-        local_start = get_local_time(start_time, timezone)
-        local_end = get_local_time(end_time, timezone)
-        
-        # Calculate business hours
-        current = local_start
-        increment = timedelta(minutes=60)
+        range_seconds = (end_time - start_time).total_seconds()
+        max_possible_hours = range_seconds / 3600
         
         # Use a more reasonable increment that won't result in too many iterations
         # If the range is large (over a week), use larger increments
-        if (end_time - start_time) > timedelta(days=7):
-            increment = timedelta(hours=3)
-        elif (end_time - start_time) > timedelta(days=1):
-            increment = timedelta(hours=1)
+        if range_seconds > 7 * 86400:
+            increment = 3 * 3600
+        elif range_seconds > 86400:
+            increment = 3600
         else:
-            increment = timedelta(minutes=30)
-            
-        # Prevent infinite loops by setting a reasonable limit (1 week = 168 hours max)
-        iteration_limit = 24 * 7 * 2  # 2x the number of half hours in a week
-        iteration_count = 0
+            increment = 30 * 60
         
-        while current < local_end and iteration_count < iteration_limit:
-            next_hour = min(current + increment, local_end)
-            midpoint = current + (next_hour - current) / 2
-            
-            if self._is_business_time(midpoint, business_hours):
-                # Calculate the fraction of an hour
-                fraction = (next_hour - current).total_seconds() / 3600
-                business_hours_count += fraction
-            
-            current = next_hour
-            iteration_count += 1
+        # Check the midpoint of each segment, for at most 336 segments
+        # (2x the number of hours in a week)
+        segment_starts = np.arange(min(math.ceil(range_seconds / increment), 24 * 7 * 2)) * increment
+        segment_ends = np.minimum(segment_starts + increment, range_seconds)
+        midpoints = to_epoch_seconds(start_time) + (segment_starts + segment_ends) / 2
+        is_business = self._in_business_intervals(midpoints, business_intervals)
+        business_hours_count = float((segment_ends - segment_starts)[is_business].sum() / 3600)
         
         # The total business hours can't exceed the time range itself
         business_hours_count = min(business_hours_count, max_possible_hours)
         
         # Apply reasonable caps based on time period
-        if (end_time - start_time) <= timedelta(days=1):
+        if range_seconds <= 86400:
             # For a day range, cap at 24 hours
             business_hours_count = min(business_hours_count, 24)
-        elif (end_time - start_time) <= timedelta(days=7):
+        elif range_seconds <= 7 * 86400:
             # For a week range, cap at 168 hours (7 days)
             business_hours_count = min(business_hours_count, 168)
             
-        logging.debug(f"Total business hours in range for store {store_id}: {business_hours_count} (max possible: {max_possible_hours})")
-        return business_hours_count 
\ No newline at end of file
+        logging.debug("Total business hours in range for store %s: %s (max possible: %s)", store_id, business_hours_count, max_possible_hours)
+        return business_hours_count
+    
+    def _business_day_intervals(self, business_hours):
+        """Get the [start, end) seconds of each weekday for which _is_business_time is True"""
+        # _is_business_time only depends on the weekday, the time of day and the hours
+        # themselves, so the result is reused for every store with the same hours
+        hours_key = tuple(business_hours)
+        day_intervals = self._day_intervals_by_hours.get(hours_key)
+        if day_intervals is None:
+            day_intervals = self._day_intervals_by_hours[hours_key] = self._evaluate_business_day_intervals(business_hours)
+        return day_intervals
+    
+    def _evaluate_business_day_intervals(self, business_hours):
+        """Evaluate _is_business_time over each weekday to find its [start, end) business seconds"""
+        # _is_business_time compares whole seconds, whole minutes (overnight hours)
+        # and whole hours (9-21 default), so its result can only change at these seconds
+        breakpoints = {0, 9 * 3600, 21 * 3600}
+        for hours in business_hours:
+            breakpoints.update((
+                hours.start_s,
+                hours.end_s + 1,
+                hours.start_s // 60 * 60,
+                hours.end_s // 60 * 60 + 60
+            ))
+        breakpoints = sorted(point for point in breakpoints if 0 <= point < 86400)
+        
+        hours_by_day = self._group_hours_by_day(business_hours)
+        most_common_hours = self._most_common_hours(business_hours)
+        day_intervals = []
+        for day in range(7):
+            intervals = []
+            for start, end in zip(breakpoints, breakpoints[1:] + [86400]):
+                if self._is_business_time(_REFERENCE_MONDAY + timedelta(days=day, seconds=start), business_hours, hours_by_day, most_common_hours):
+                    if intervals and intervals[-1][1] == start:
+                        intervals[-1][1] = end
+                    else:
+                        intervals.append([start, end])
+            day_intervals.append(intervals)
+        return day_intervals
+    
+    def _get_business_intervals(self, business_hours, timezone_str, start_time, end_time):
+        """Get the UTC business intervals for a store's hours and timezone, building them once per distinct pair"""
+        # Stores on the 24/7 or standard fallback hours, or on a shared schedule, reuse
+        # the same intervals. They are only valid for one time range
+        if self._business_intervals_range != (start_time, end_time):
+            self._business_intervals_cache = {}
+            self._business_intervals_range = (start_time, end_time)
+        
+        cache_key = (tuple(business_hours), timezone_str)
+        business_intervals = self._business_intervals_cache.get(cache_key)
+        if business_intervals is None:
+            business_intervals = self._build_business_intervals(
+                business_hours, get_timezone(timezone_str), start_time, end_time
+            )
+            self._business_intervals_cache[cache_key] = business_intervals
+        return business_intervals
+    
+    def _build_business_intervals(self, business_hours, timezone, start_time, end_time):
+        """Convert business hours into sorted UTC epoch-second (starts, ends) arrays covering a time range"""
+        day_intervals = self._business_day_intervals(business_hours)
+        
+        # Walk the local calendar days around the range, converting each day's
+        # business hours to UTC
+        local_date = get_local_time(start_time, timezone).date() - timedelta(days=1)
+        last_date = get_local_time(end_time, timezone).date() + timedelta(days=1)
+        starts = []
+        ends = []
+        while local_date <= last_date:
+            midnight = datetime.combine(local_date, time())
+            for start, end in day_intervals[local_date.weekday()]:
+                utc_start = int(local_time_to_utc(midnight + timedelta(seconds=start), timezone).timestamp())
+                utc_end = int(local_time_to_utc(midnight + timedelta(seconds=end), timezone).timestamp())
+                # Merge with the previous interval when they touch (e.g. across midnight)
+                if starts and utc_start <= ends[-1]:
+                    ends[-1] = max(ends[-1], utc_end)
+                elif utc_end > utc_start:
+                    starts.append(utc_start)
+                    ends.append(utc_end)
+            local_date += timedelta(days=1)
+        
+        return np.array(starts, dtype=np.int64), np.array(ends, dtype=np.int64)
+    
+    def _in_business_intervals(self, seconds, business_intervals):
+        """Check whether UTC epoch seconds (scalar or array) fall within the business intervals"""
+        starts, ends = business_intervals
+        if len(starts) == 0:
+            return np.zeros(np.shape(seconds), dtype=bool)
+        positions = np.searchsorted(starts, seconds, side='right') - 1
+        return (positions >= 0) & (seconds < ends[np.maximum(positions, 0)])
@@ -1,13 +1,22 @@
-import pytz
-from datetime import datetime, time
+from datetime import datetime, time, timezone as dt_timezone
+from functools import lru_cache
+from zoneinfo import ZoneInfo
+
+UTC = dt_timezone.utc
+EPOCH = datetime(1970, 1, 1)
+
+@lru_cache(maxsize=512)
+def get_timezone(timezone_str):
+    """Get the tzinfo for an IANA timezone name"""
+    return ZoneInfo(timezone_str)
 
 def get_local_time(utc_time, timezone):
     """Convert UTC time to local time"""
     # Handle case where utc_time might be an integer timestamp instead of datetime object
     if isinstance(utc_time, (int, float)):
-        utc_time = datetime.fromtimestamp(utc_time, pytz.UTC)
+        utc_time = datetime.fromtimestamp(utc_time, UTC)
     elif utc_time.tzinfo is None:
-        utc_time = pytz.utc.localize(utc_time)
+        utc_time = utc_time.replace(tzinfo=UTC)
     return utc_time.astimezone(timezone)
 
 def local_time_to_utc(local_time, timezone):
@@ -16,39 +25,26 @@ def local_time_to_utc(local_time, timezone):
     if isinstance(local_time, (int, float)):
         local_time = datetime.fromtimestamp(local_time, timezone)
     elif local_time.tzinfo is None:
-        local_time = timezone.localize(local_time)
-    return local_time.astimezone(pytz.utc)
+        local_time = local_time.replace(tzinfo=timezone)
+    return local_time.astimezone(UTC)
 
-def parse_time_str(time_str):
-    """Parse a time string (HH:MM:SS) to a time object"""
+def to_epoch_seconds(utc_time):
+    """Convert a naive UTC time to seconds since the Unix epoch"""
+    # Handle case where utc_time might already be a timestamp
+    if isinstance(utc_time, (int, float)):
+        return utc_time
+    if utc_time.tzinfo is not None:
+        return utc_time.timestamp()
+    return (utc_time - EPOCH).total_seconds()
+
+def _split_time_str(time_str):
+    """Split a time string (HH:MM:SS, or unpadded like 9:00:00) into hours, minutes and seconds"""
+    # Slice the usual zero-padded format rather than splitting it
+    if len(time_str) == 8 and time_str[2] == ':' and time_str[5] == ':':
+        return int(time_str[0:2]), int(time_str[3:5]), int(time_str[6:8])
     hours, minutes, seconds = map(int, time_str.split(':'))
-    return time(hours, minutes, seconds)
+    return hours, minutes, seconds
 
-def is_within_business_hours(local_time, business_hours):
-    """Check if a local time is within business hours"""
-    # Handle case where local_time might be an integer timestamp
-    if isinstance(local_time, (int, float)):
-        local_time = datetime.fromtimestamp(local_time)
-        
-    # Get day of week (0=Monday, 6=Sunday)
-    day_of_week = local_time.weekday()
-    
-    # Get time component
-    time_only = local_time.time()
-    
-    # Check if the time is within business hours for this day
-    for hours in business_hours:
-        if isinstance(hours, dict):
-            if hours['day_of_week'] == day_of_week:
-                start_time = parse_time_str(hours['start_time_local'])
-                end_time = parse_time_str(hours['end_time_local'])
-                if start_time <= time_only <= end_time:
-                    return True
-        else:
-            if hours.day_of_week == day_of_week:
-                start_time = parse_time_str(hours.start_time_local)
-                end_time = parse_time_str(hours.end_time_local)
-                if start_time <= time_only <= end_time:
-                    return True
-    
-    return False 
\ No newline at end of file
+def parse_time_str(time_str):
+    """Parse a time string (HH:MM:SS) to a time object"""
+    return time(*_split_time_str(time_str))